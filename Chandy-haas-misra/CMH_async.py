@@ -0,0 +1,122 @@
+"""Chandy-Misra-Haas engine on an asyncio event loop.
+
+Every process that receives probes gets an asyncio.Queue inbox served by its
+own coroutine. detect() resolves as soon as a process declares a deadlock, or
+once the system is quiescent: every delivered probe has been handled and no
+new one is pending. It raises the error of a probe handler that fails.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import CMH_diff_sites as cmh
+
+
+class AsyncCMHEngine:
+    """Probe delivery with one inbox and one serving coroutine per process"""
+    def __init__(self, records, policy="all_blocked", initiators=None, stop_on_deadlock=True, site_aware=False):
+        self.records = records
+        self.policy = policy
+        self.initiators = initiators
+        self.stop_on_deadlock = stop_on_deadlock
+        self.site_aware = site_aware
+        self.inboxes = {}
+        self.tasks = []
+        self.pending = 0
+        self.deadlocked = []
+        self.result = None
+        self.started = 0.0
+
+    def deliver(self, probe):
+        pid = probe.receiver
+        inbox = self.inboxes.get(pid)
+        if inbox is None:
+            # Processes nobody sends to never get a coroutine
+            inbox = self.inboxes[pid] = asyncio.Queue()
+            self.tasks.append(asyncio.get_running_loop().create_task(self._serve(cmh.process_list[pid], inbox)))
+        self.pending += 1
+        inbox.put_nowait(probe)
+
+    async def receiveProbe(self, process, probe):
+        """Coroutine handler for one probe"""
+        process.trigger_event('receiveProbe', probe)
+
+    async def _serve(self, process, inbox):
+        while True:
+            probe = await inbox.get()
+            try:
+                await self.receiveProbe(process, probe)
+            except Exception as error:
+                # The run cannot finish any more, so detect() raises instead
+                if not self.result.done():
+                    self.result.set_exception(error)
+                return
+            self.pending -= 1
+            if self.pending == 0:
+                self._resolve(quiescent=True)
+
+    def _on_deadlock(self, process):
+        self.deadlocked.append(process.pid)
+        if self.stop_on_deadlock:
+            self._resolve(quiescent=False)
+
+    def _resolve(self, quiescent):
+        if not self.result.done():
+            self.result.set_result(self._summary(quiescent))
+
+    def _summary(self, quiescent):
+        return {
+            "deadlock": bool(self.deadlocked),
+            "deadlocked": sorted(self.deadlocked),
+            "quiescent": quiescent,
+            "probes_sent": sum(p.probeSentCount for p in cmh.process_list),
+            "probes_received": sum(p.probeReceiveCount for p in cmh.process_list),
+            "elapsed": time.perf_counter() - self.started,
+        }
+
+    async def detect(self):
+        """Run a detection and return its result once it is known"""
+        # Every run starts from the records again, so the engine can be reused
+        self.inboxes = {}
+        self.tasks = []
+        self.pending = 0
+        self.deadlocked = []
+        self.started = time.perf_counter()
+        self.result = asyncio.get_running_loop().create_future()
+        cmh.process_list = cmh.build_processes(self.records)
+        for p in cmh.process_list:
+            p.add_event_listener('deadlockDetected', self._on_deadlock)
+        cmh.probe_router = self
+        try:
+            cmh.start_detection(self.policy, self.initiators, self.site_aware)
+            if self.pending == 0:
+                self._resolve(quiescent=True)
+            return await self.result
+        finally:
+            cmh.probe_router = None
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+def run_async(records, policy="all_blocked", initiators=None, stop_on_deadlock=True, site_aware=False):
+    """Run an asyncio detection to its result from synchronous code"""
+    return asyncio.run(AsyncCMHEngine(records, policy, initiators, stop_on_deadlock, site_aware).detect())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chandy-Misra-Haas detection on an asyncio event loop")
+    parser.add_argument("file", help="JSON list of [pid, sid, blocked, waiting_on] records")
+    parser.add_argument("--all", action="store_true",
+                        help="run until quiescent instead of stopping at the first deadlock")
+    cmh.add_engine_arguments(parser)
+    args = parser.parse_args()
+    cmh.configure_cli_logging(args)
+    with open(args.file) as f:
+        records = json.load(f)
+    print(json.dumps(run_async(records, args.policy, args.initiators, not args.all, args.site_aware)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,117 @@
+import argparse
+import json
+import os
+import queue
+import sys
 import threading
 import time
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+from array import array
+from collections import deque
+# The GUI dependencies are optional so the engine can run headless on servers
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext, filedialog
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+except ImportError:
+    tk = None
+# Drawing the graph, in the GUI or to an image file, also needs these
+try:
+    import networkx as nx
+    from matplotlib.figure import Figure
+except ImportError:
+    nx = None
+# The neighbourhood search, DOT export and drawing are shared with the
+# centralized detector
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Deadlock-detection-py"))
+from CycleDetectionDFS import LABEL_LIMIT, CycleDetectionDFS, drawWaitForGraph, expandNeighbourhood, writeDot
 
 # Global variables
 process_list = []
-ProbeQueue = []
-running = True
+# Probes waiting for delivery by dispatch_pending
+ProbeQueue = queue.Queue()
+# Transport used by post_probe; None delivers through the global ProbeQueue
+probe_router = None
+# Same-site dependencies of the site-aware mode, set by start_detection
+site_dependencies = None
 log_text = None
 canvas = None
+# Probes each process keeps in its sent/received history for diagnostics;
+# 0 keeps only the counters, None keeps everything
+PROBE_HISTORY_LIMIT = 100
 
 class Probe:
+    # A probe is just three pids; slots keep it free of a per-instance dict
+    __slots__ = ("origin", "sender", "receiver")
+
     def __init__(self, origin, sender, receiver):
         self.origin = origin
         self.sender = sender
         self.receiver = receiver
     
     def __repr__(self):
-        return f"Probe(origin={self.origin.pid}, sender={self.sender.pid}, receiver={self.receiver.pid})"
+        return f"Probe(origin={self.origin}, sender={self.sender}, receiver={self.receiver})"
+
+    def __eq__(self, other):
+        return isinstance(other, Probe) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def as_tuple(self):
+        return (self.origin, self.sender, self.receiver)
+
+    def __reduce__(self):
+        # Pickles as a plain integer triple for cross-process transport
+        return (Probe, self.as_tuple())
+
+class ProbeBatch:
+    """Probes packed as (origin, sender, receiver) triples in one int array"""
+    def __init__(self, values=None):
+        self.values = values if values is not None else array('i')
+
+    def append(self, probe):
+        self.values.extend((probe.origin, probe.sender, probe.receiver))
+
+    def __len__(self):
+        return len(self.values) // 3
+
+    def __iter__(self):
+        values = self.values
+        for i in range(0, len(values), 3):
+            yield Probe(values[i], values[i + 1], values[i + 2])
+
+    def to_bytes(self):
+        return self.values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        values = array('i')
+        values.frombytes(data)
+        return cls(values)
+
+    def __reduce__(self):
+        return (ProbeBatch.from_bytes, (self.to_bytes(),))
 
 class Process:
-    def __init__(self, pid, sid, process_count, isBlocked=False, isWaitingOn=None):
+    def __init__(self, pid, sid, process_count, isBlocked=False, isWaitingOn=None, history=PROBE_HISTORY_LIMIT):
         self.pid = pid
         self.sid = sid
         self.process_count = process_count
-        # Initially the dependency is set to false for all processes
-        # dependent[j] is true if j depends on i
-        self.dependent = [False] * self.process_count
+        # Initially the process has no dependencies
+        # j in dependent if j depends on i; only real dependencies are stored
+        self.dependent = set()
         self.isBlocked = isBlocked
         self.deadlockDetected = False
         # List of process on which the current process is waiting on
         self.isWaitingOn = isWaitingOn if isWaitingOn is not None else []
-        # Each process maintains its own list of probes sent, received and their counts
-        self.probeReceveQueue = []
-        self.probeSendQueue = []
+        # Each process keeps the last probes sent and received and their counts
+        self.probeReceveQueue = deque(maxlen=history)
+        self.probeSendQueue = deque(maxlen=history)
         self.probeReceiveCount = 0
         self.probeSentCount = 0
+        # (initiator, sender) pairs this process has already acted on
+        self.repliedPairs = set()
         # This is the list of event listeners and when a probe is received the event is added to the event_listener
         self.listeners = {}
 
@@ -53,15 +125,20 @@ class Process:
     def trigger_event(self, event_name, *args, **kwargs):
         if event_name in self.listeners:
             handler = self.listeners[event_name]
-            log_message(f"Arguments: {args}")
             handler(*args, **kwargs)
 
+    def addDependent(self, pid):
+        self.dependent.add(pid)
+
+    def removeDependent(self, pid):
+        self.dependent.discard(pid)
+
     # Case where the process is blocked on itself
     def makeProcessBlocked(self):
         self.isBlocked = True
         if self.pid not in self.isWaitingOn:
             self.isWaitingOn.append(self.pid)
-        self.dependent[self.pid] = True
+        self.addDependent(self.pid)
 
     def declareDeadlock(self):
         log_message(f"DEADLOCK DETECTED: Process {self.pid} is in a deadlock state")
@@ -69,11 +146,13 @@ class Process:
         self.deadlockDetected = True
         self.isBlocked = True
         self.makeProcessBlocked()
+        # Lets an engine learn about the deadlock without polling
+        self.trigger_event('deadlockDetected', self)
         
     def isLocallyDependentOn(self, process):
         if self.pid == process.pid:
             return True
-        if process.dependent[self.pid] and process.sid == self.sid:
+        if self.pid in process.dependent and process.sid == self.sid:
             return True
         return False
 
@@ -86,69 +165,501 @@ class Process:
         return self.sid != process.sid
 
     def sendProbe(self, initiator, sender, receiver):
-        print(sender.checkWaitingOn(receiver), initiator.isLocallyDependentOn(sender))
         if sender.checkWaitingOn(receiver) and initiator.isLocallyDependentOn(sender) :          ##and sender.checkDifferentSites(receiver) and initiator.isLocallyDependentOn(sender):
-            probe = Probe(initiator, sender, receiver)
-            log_message(f"Sent probe: {probe}")
+            probe = Probe(initiator.pid, sender.pid, receiver.pid)
+            if event_log.trace:
+                event_log.emit(TRACE, "probe_sent", origin=initiator.pid, sender=sender.pid, receiver=receiver.pid)
             sender.probeSendQueue.append(probe)
             sender.probeSentCount += 1
             receiver.add_event_listener('receiveProbe', receiver.receiveProbe)
-            ProbeQueue.append(probe)
+            post_probe(probe)
 
-    def checkIfNotReplied(self, process):
-        for probe in self.probeReceveQueue:
-            if probe.sender == process:
-                return True
-        return False
+    def checkIfNotReplied(self, initiator, sender):
+        return (initiator, sender) not in self.repliedPairs
 
     def receiveProbe(self, probe):
-        log_message(f"Received probe: {probe}")
+        if event_log.trace:
+            event_log.emit(TRACE, "probe_received", origin=probe.origin,
+                           sender=probe.sender, receiver=probe.receiver)
         self.probeReceveQueue.append(probe)
         self.probeReceiveCount += 1
         initiator = probe.origin
         sender = probe.sender
-        receiver = probe.receiver
+        receiver = self
        
-        if receiver.isBlocked and (not receiver.dependent[initiator.pid]) and receiver.checkIfNotReplied(sender):
-            receiver.dependent[initiator.pid] = True
+        if receiver.isBlocked and (initiator not in receiver.dependent) and receiver.checkIfNotReplied(initiator, sender):
+            receiver.repliedPairs.add((initiator, sender))
+            receiver.addDependent(initiator)
             
-            if receiver.pid == initiator.pid:
+            if receiver.pid == initiator:
                 receiver.declareDeadlock()
             else:
-                for m_pid in range(receiver.process_count):
-                    if m_pid < len(process_list):  # Ensure valid index
-                        Pm = process_list[m_pid]
-                        for n_pid in Pm.isWaitingOn:
-                            if n_pid < len(process_list):  # Make sure the n_pid is valid
-                                Pn = process_list[n_pid]
-                                
-                                if receiver.isLocallyDependentOn(Pm) and \
-                                Pm.checkWaitingOn(Pn) :                        ##and \
-                                                                                ##Pm.checkDifferentSites(Pn)
-                                    new_probe = Probe(initiator, Pm, Pn)
-                                    receiver.probeSendQueue.append(new_probe)
-                                    receiver.probeSentCount += 1
-                                    Pn.add_event_listener('receiveProbe', Pn.receiveProbe)
-                                    ProbeQueue.append(new_probe)
+                # Every wait edge carries probes, so the receiver only
+                # forwards along its own waits; each process downstream
+                # forwards its own when the probe reaches it
+                for n_pid in dict.fromkeys(receiver.isWaitingOn):
+                    if n_pid < len(process_list):  # Make sure the n_pid is valid
+                        Pn = process_list[n_pid]
+                        new_probe = Probe(initiator, receiver.pid, Pn.pid)
+                        if event_log.trace:
+                            event_log.emit(TRACE, "probe_sent", origin=initiator, sender=receiver.pid, receiver=Pn.pid)
+                        receiver.probeSendQueue.append(new_probe)
+                        receiver.probeSentCount += 1
+                        Pn.add_event_listener('receiveProbe', Pn.receiveProbe)
+                        post_probe(new_probe)
+
+    # Site-aware mode: waits inside a site are resolved from site_dependencies
+    # and probes are only sent along waits between different sites
+    def initiateSiteDetection(self):
+        if not self.isBlocked:
+            return
+        # A cycle inside the site is found without any message
+        if site_dependencies.on_local_cycle(self.pid):
+            self.declareDeadlock()
+            return
+        self.forwardAcrossSites(self.pid)
+
+    def forwardAcrossSites(self, initiator):
+        for m_pid, n_pid in site_dependencies.inter_site_waits(self.pid):
+            self.sendSiteProbe(initiator, m_pid, process_list[n_pid])
+
+    def sendSiteProbe(self, initiator, sender, receiver):
+        new_probe = Probe(initiator, sender, receiver.pid)
+        if event_log.trace:
+            event_log.emit(TRACE, "probe_sent", origin=initiator, sender=sender, receiver=receiver.pid)
+        self.probeSendQueue.append(new_probe)
+        self.probeSentCount += 1
+        receiver.add_event_listener('receiveProbe', receiver.receiveSiteProbe)
+        post_probe(new_probe)
+
+    def receiveSiteProbe(self, probe):
+        if event_log.trace:
+            event_log.emit(TRACE, "probe_received", origin=probe.origin,
+                           sender=probe.sender, receiver=probe.receiver)
+        self.probeReceveQueue.append(probe)
+        self.probeReceiveCount += 1
+        initiator = probe.origin
+        sender = probe.sender
+
+        if self.isBlocked and (initiator not in self.dependent) and self.checkIfNotReplied(initiator, sender):
+            self.repliedPairs.add((initiator, sender))
+            self.addDependent(initiator)
+            if self.pid == initiator:
+                self.declareDeadlock()
+            elif site_dependencies.reaches(self.pid, initiator):
+                # The probe is back on the initiator's site and the receiver
+                # waits on the initiator there, so the initiator lies on a
+                # cycle. Only the initiator's own handler may flag it, so the
+                # probe is passed on along those local waits
+                self.sendSiteProbe(initiator, self.pid, process_list[initiator])
+            else:
+                self.forwardAcrossSites(initiator)
+
+class LocalDependencyIndex:
+    """Waits between blocked processes of the same site, condensed once per site
+
+    The first question about a site finds the strongly connected components
+    of its local waits, and per component whether it holds a cycle and which
+    waits to other sites it reaches; later questions are lookups. Each site
+    only reads its own processes, so in a multi-site run the processes of
+    other sites may be stand-ins that carry just a sid.
+    """
+    def __init__(self, processes):
+        self.processes = processes
+        self.members = {}
+        for p in processes:
+            self.members.setdefault(p.sid, []).append(p.pid)
+        self.component_of = {}
+        # Per component: holds a cycle, the components waiting on it, and the
+        # (sender, receiver) waits to other sites reachable from it
+        self.cyclic = []
+        self.predecessors = []
+        self.exits = []
+        # Components that reach a component, kept for the ones asked about
+        self.ancestors = {}
+
+    def _component(self, pid):
+        component = self.component_of.get(pid)
+        if component is None:
+            self._condense(self.processes[pid].sid)
+            component = self.component_of[pid]
+        return component
+
+    def _condense(self, sid):
+        processes = self.processes
+        members = self.members[sid]
+        local = {pid: index for index, pid in enumerate(members)}
+        waits = [[local[wait_pid] for wait_pid in dict.fromkeys(processes[pid].isWaitingOn)
+                  if wait_pid in local and processes[wait_pid].isBlocked] for pid in members]
+        first = len(self.cyclic)
+        components = CycleDetectionDFS(waits).findStronglyConnectedComponents()
+        for index, nodes in enumerate(components):
+            for node in nodes:
+                self.component_of[members[node]] = first + index
+            self.predecessors.append([])
+        # Components come out in reverse topological order, so the exits of
+        # every component a component waits on are already collected
+        for index, nodes in enumerate(components):
+            component = first + index
+            successors = dict.fromkeys(self.component_of[members[wait]] for node in nodes for wait in waits[node])
+            successors.pop(component, None)
+            for successor in successors:
+                self.predecessors[successor].append(component)
+            own = [(members[node], wait_pid) for node in nodes
+                   for wait_pid in dict.fromkeys(processes[members[node]].isWaitingOn)
+                   if wait_pid < len(processes) and processes[wait_pid].sid != sid]
+            if not own and len(successors) == 1:
+                # Chains share one list instead of copying it at every step
+                exits = self.exits[next(iter(successors))]
+            else:
+                exits = list(dict.fromkeys(own + [wait for successor in successors for wait in self.exits[successor]]))
+            self.exits.append(exits)
+            self.cyclic.append(len(nodes) > 1 or nodes[0] in waits[nodes[0]])
+
+    def on_local_cycle(self, pid):
+        return self.cyclic[self._component(pid)]
+
+    def inter_site_waits(self, pid):
+        """(sender, receiver) waits to other sites of pid and the blocked same-site processes it waits on"""
+        return self.exits[self._component(pid)]
+
+    def reaches(self, pid, target):
+        """Whether pid waits on target directly or through blocked processes of its site"""
+        if self.processes[target].sid != self.processes[pid].sid:
+            return False
+        source = self._component(pid)
+        goal = self._component(target)
+        if source == goal:
+            return self.cyclic[goal]
+        # A component only waits on components found before it
+        if source < goal:
+            return False
+        ancestors = self.ancestors.get(goal)
+        if ancestors is None:
+            ancestors = set()
+            stack = [goal]
+            while stack:
+                for predecessor in self.predecessors[stack.pop()]:
+                    if predecessor not in ancestors:
+                        ancestors.add(predecessor)
+                        stack.append(predecessor)
+            self.ancestors[goal] = ancestors
+        return source in ancestors
+
+# Log levels; probe-level events are TRACE and are off by default
+TRACE, DEBUG, INFO, WARNING = 5, 10, 20, 30
+LOG_LEVELS = {"trace": TRACE, "debug": DEBUG, "info": INFO, "warning": WARNING}
+
+class EventLog:
+    """Leveled, structured event log
+
+    Records are (timestamp, level, event, fields) tuples handed to every sink.
+    Hot paths test the trace attribute before building any fields, so
+    disabled probe tracing costs one attribute lookup.
+    """
+    def __init__(self, level=INFO, sinks=None):
+        self.sinks = sinks if sinks is not None else []
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = level
+        self.trace = level <= TRACE
+
+    def emit(self, level, event, **fields):
+        if level < self.level:
+            return
+        record = (time.time(), level, event, fields)
+        for sink in self.sinks:
+            sink(record)
+
+def format_event(record):
+    """Human readable line for a log record"""
+    _, _, event, fields = record
+    if event == "message":
+        return fields["text"]
+    return event + " " + " ".join(f"{key}={value}" for key, value in fields.items())
+
+class StreamSink:
+    """Writes every record to a text stream as it arrives"""
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, record):
+        print(format_event(record), file=self.stream or sys.stdout)
+
+class RingBufferSink:
+    """Keeps the last capacity records in memory until they are drained"""
+    def __init__(self, capacity=10000):
+        self.records = deque(maxlen=capacity)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def drain(self):
+        drained = []
+        while True:
+            try:
+                drained.append(self.records.popleft())
+            except IndexError:
+                return drained
+
+event_log = EventLog(INFO, [StreamSink()])
 
 # Global log function
-def log_message(message):
-    global log_text
-    if log_text:
-        log_text.insert(tk.END, message + "\n")
-        log_text.see(tk.END)
+def log_message(message, level=INFO):
+    event_log.emit(level, "message", text=message)
+
+class TerminationDetector:
+    """Detects global termination by counting outstanding probes
+
+    Dijkstra-Scholten style deficit counting: posting a probe takes one unit
+    of credit and probe_done returns it once the handler has run, by which
+    time every follow-up probe has already been posted. The count therefore
+    only reaches zero when no probe is queued or being handled, and
+    on_quiescent is called in the thread that returned the last unit.
+    """
+    def __init__(self, on_quiescent=None):
+        self.outstanding = 0
+        self.on_quiescent = on_quiescent
+        self.condition = threading.Condition()
+
+    def probe_posted(self):
+        with self.condition:
+            self.outstanding += 1
+
+    def probe_done(self):
+        with self.condition:
+            self.outstanding -= 1
+            finished = self.outstanding == 0
+            if finished:
+                self.condition.notify_all()
+        if finished and self.on_quiescent:
+            self.on_quiescent()
+
+    def is_quiescent(self):
+        with self.condition:
+            return self.outstanding == 0
+
+    def wait(self, timeout=None):
+        """Wait until every posted probe has been handled"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.outstanding == 0, timeout)
+
+    def reset(self):
+        with self.condition:
+            self.outstanding = 0
+            self.condition.notify_all()
+
+# Termination of probes delivered through the global ProbeQueue
+probe_termination = TerminationDetector()
+
+def post_probe(probe):
+    """Hand a probe to the active transport for delivery"""
+    if probe_router is not None:
+        probe_router.deliver(probe)
     else:
-        print(message)
-
-def ProbeDispatcher():
-    global running
-    while running:
-        if ProbeQueue:
-            probe = ProbeQueue.pop(0)
-            receiver = probe.receiver
-            receiver.trigger_event('receiveProbe', probe)
-        else:
-            time.sleep(0.1)
+        probe_termination.probe_posted()
+        ProbeQueue.put(probe)
+
+def handle_probe(probe):
+    """Deliver a probe to its receiving process"""
+    process_list[probe.receiver].trigger_event('receiveProbe', probe)
+
+def clear_probe_queue():
+    """Drop every probe still waiting for delivery"""
+    while True:
+        try:
+            ProbeQueue.get_nowait()
+        except queue.Empty:
+            break
+    probe_termination.reset()
+
+class MailboxScheduler:
+    """Per-process mailboxes drained by a pool of worker threads
+
+    Ownership rules: a pid sits in the ready queue at most once, and the
+    worker that takes it owns that process until its mailbox is empty, so
+    receiveProbe never runs twice at the same time for one receiver. Probes
+    posted before start() wait in their mailboxes, which lets the initiators
+    send their first probes without racing the workers. After stop() returns
+    no worker is running and every undelivered probe has been dropped. A
+    handler that raises still returns its termination credit; the first such
+    error is kept in error and raised by wait_idle.
+    """
+    def __init__(self, workers=4, on_quiescent=None):
+        self.workers = workers
+        self.mailboxes = {}
+        self.scheduled = set()
+        self.termination = TerminationDetector(on_quiescent)
+        self.lock = threading.Lock()
+        self.ready = queue.Queue()
+        self.threads = []
+        self.stopping = False
+        self.error = None
+
+    def deliver(self, probe):
+        pid = probe.receiver
+        with self.lock:
+            # A probe posted by a handler that was running when stop() was
+            # called is dropped with the rest
+            if self.stopping:
+                return
+            self.termination.probe_posted()
+            mailbox = self.mailboxes.get(pid)
+            if mailbox is None:
+                mailbox = self.mailboxes[pid] = deque()
+            mailbox.append(probe)
+            if pid not in self.scheduled:
+                self.scheduled.add(pid)
+                self.ready.put(pid)
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            pid = self.ready.get()
+            if pid is None:
+                return
+            mailbox = self.mailboxes[pid]
+            while True:
+                with self.lock:
+                    if not mailbox:
+                        self.scheduled.discard(pid)
+                        break
+                    probe = mailbox.popleft()
+                try:
+                    handle_probe(probe)
+                except BaseException as error:
+                    with self.lock:
+                        if self.error is None:
+                            self.error = error
+                finally:
+                    self.termination.probe_done()
+
+    def wait_idle(self, timeout=None):
+        """Wait until every delivered probe has been handled; re-raises a handler error"""
+        idle = self.termination.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return idle
+
+    def stop(self):
+        # Empty the mailboxes first so the workers only finish the probe they
+        # are handling; none of them may touch the processes after this returns
+        with self.lock:
+            self.stopping = True
+            for mailbox in self.mailboxes.values():
+                mailbox.clear()
+        for _ in self.threads:
+            self.ready.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+def build_processes(records, history=PROBE_HISTORY_LIMIT):
+    """Create the process list from (pid, sid, blocked, waiting_on) records"""
+    records = sorted(records, key=lambda record: record[0])
+    process_count = len(records)
+    processes = []
+    for i, (pid, sid, blocked, waiting_on) in enumerate(records):
+        if pid != i:
+            raise ValueError(f"Process ids must be 0..{process_count - 1}, got {pid}")
+        processes.append(Process(
+            pid=pid,
+            sid=sid,
+            process_count=process_count,
+            isBlocked=bool(blocked),
+            isWaitingOn=list(waiting_on),
+            history=history
+        ))
+    return processes
+
+# Which processes start probes: every blocked process, only the lowest pid of
+# each cycle candidate (strongly connected set of blocked processes), or an
+# explicitly specified set of pids
+INITIATION_POLICIES = ("all_blocked", "lowest_per_cycle", "specified")
+
+def cycle_candidates(processes):
+    """Strongly connected sets of blocked processes that contain a cycle"""
+    count = len(processes)
+    waits = [[wait_pid for wait_pid in p.isWaitingOn if wait_pid < count and processes[wait_pid].isBlocked]
+             if p.isBlocked else [] for p in processes]
+    return CycleDetectionDFS(waits).findDeadlockedSets()[0]
+
+def select_initiators(policy="all_blocked", initiators=None):
+    """Pids that start probes under the given initiation policy"""
+    if policy == "all_blocked":
+        return [p.pid for p in process_list if p.isBlocked]
+    if policy == "lowest_per_cycle":
+        return sorted(component[0] for component in cycle_candidates(process_list))
+    if policy == "specified":
+        return sorted(pid for pid in set(initiators or []) if 0 <= pid < len(process_list))
+    raise ValueError(f"Unknown initiation policy {policy!r}, expected one of {INITIATION_POLICIES}")
+
+def start_detection(policy="all_blocked", initiators=None, site_aware=False):
+    """Send the initial probes along the wait edges of the selected initiators
+
+    With site_aware, waits inside a site are resolved locally and probes only
+    travel along waits between sites.
+    """
+    global site_dependencies
+    if site_aware:
+        site_dependencies = LocalDependencyIndex(process_list)
+    for pid in select_initiators(policy, initiators):
+        p = process_list[pid]
+        if site_aware:
+            p.initiateSiteDetection()
+            continue
+        for wait_pid in dict.fromkeys(p.isWaitingOn):
+            if wait_pid < len(process_list):
+                p.sendProbe(initiator=p, sender=p, receiver=process_list[wait_pid])
+
+def dispatch_pending():
+    """Deliver queued probes in the calling thread until none are left"""
+    while True:
+        try:
+            probe = ProbeQueue.get_nowait()
+        except queue.Empty:
+            return
+        handle_probe(probe)
+        probe_termination.probe_done()
+
+def collect_result():
+    """Deadlocked pids and probe counts of the current process list"""
+    return {
+        "deadlocked": [p.pid for p in process_list if p.deadlockDetected],
+        "probes_sent": sum(p.probeSentCount for p in process_list),
+        "probes_received": sum(p.probeReceiveCount for p in process_list),
+    }
+
+def run_headless(records, policy="all_blocked", initiators=None, workers=0, history=PROBE_HISTORY_LIMIT,
+                 site_aware=False):
+    """Run a full detection without the GUI and return its result
+
+    With workers > 0 probes are handled by a MailboxScheduler pool instead of
+    being drained in the calling thread.
+    """
+    global process_list, probe_router
+    process_list = build_processes(records, history)
+    clear_probe_queue()
+    if not workers:
+        start_detection(policy, initiators, site_aware)
+        dispatch_pending()
+        return collect_result()
+    scheduler = MailboxScheduler(workers)
+    probe_router = scheduler
+    try:
+        start_detection(policy, initiators, site_aware)
+        scheduler.start()
+        scheduler.wait_idle()
+    finally:
+        scheduler.stop()
+        probe_router = None
+    return collect_result()
 
 def print_system_state():
     """Print the current state of all processes"""
@@ -158,12 +669,96 @@ def print_system_state():
         deadlock = "DEADLOCKED" if p.deadlockDetected else ""
         state_text += f"Process {p.pid} (Site {p.sid}): {status} {deadlock}\n"
         state_text += f"  Waiting on: {p.isWaitingOn}\n"
-        state_text += f"  Dependencies: {[i for i, dep in enumerate(p.dependent) if dep]}\n"
+        state_text += f"  Dependencies: {sorted(p.dependent)}\n"
         state_text += f"  Probes sent: {p.probeSentCount}, received: {p.probeReceiveCount}\n"
     state_text += "===================\n"
     log_message(state_text)
     return state_text
 
+# Views of the wait-for graph: every process, one node per site, or only the
+# deadlocked cycles and the processes next to them
+GRAPH_VIEWS = ("full", "sites", "deadlock")
+
+def state_colour(deadlocked, blocked):
+    """Fill colour of a node in the drawing"""
+    if deadlocked:
+        return 'red'
+    if blocked:
+        return 'orange'
+    return 'lightblue'
+
+def deadlock_neighbourhood(processes, radius=1):
+    """Pids of the deadlocked cycles and of processes within radius wait edges of them"""
+    count = len(processes)
+    focus = {pid for component in cycle_candidates(processes) for pid in component}
+    focus.update(p.pid for p in processes if p.deadlockDetected)
+    waits = [[wait_pid for wait_pid in p.isWaitingOn if wait_pid < count] for p in processes]
+    return expandNeighbourhood(waits, focus, radius)
+
+def graph_view(processes, view="full", radius=1):
+    """Nodes {key: (label, colour)} and edges {(key, key): label} of one view"""
+    count = len(processes)
+    nodes = {}
+    edges = {}
+    if view == "sites":
+        members = {}
+        for p in processes:
+            total, blocked, deadlocked, local_waits = members.get(p.sid, (0, 0, 0, 0))
+            for wait_pid in p.isWaitingOn:
+                if wait_pid >= count or wait_pid == p.pid:
+                    continue
+                target = processes[wait_pid].sid
+                if target == p.sid:
+                    local_waits += 1
+                else:
+                    edges[(p.sid, target)] = edges.get((p.sid, target), 0) + 1
+            members[p.sid] = (total + 1, blocked + p.isBlocked, deadlocked + p.deadlockDetected, local_waits)
+        for sid in sorted(members):
+            total, blocked, deadlocked, local_waits = members[sid]
+            label = f"Site{sid}\n{total} processes\n{local_waits} local waits"
+            if deadlocked:
+                label += f"\n{deadlocked} deadlocked"
+            nodes[sid] = (label, state_colour(deadlocked, blocked))
+        return nodes, {key: str(waits) for key, waits in edges.items()}
+    if view == "deadlock":
+        pids = deadlock_neighbourhood(processes, radius)
+    elif view == "full":
+        pids = range(count)
+    else:
+        raise ValueError(f"unknown graph view {view!r}")
+    for pid in pids:
+        p = processes[pid]
+        nodes[pid] = (f"P{pid}\nSite{p.sid}", state_colour(p.deadlockDetected, p.isBlocked))
+    for pid in nodes:
+        p = processes[pid]
+        for wait_pid in p.isWaitingOn:
+            # declareDeadlock adds a self-wait to every process it flags; the
+            # node colour already shows the deadlock
+            if wait_pid == pid and p.deadlockDetected:
+                continue
+            if wait_pid in nodes:
+                edges[(pid, wait_pid)] = ""
+    return nodes, edges
+
+def export_graph(path, processes, view="full", radius=1):
+    """Save a view to a .dot file, or render it to an image file such as .svg or .png"""
+    nodes, edges = graph_view(processes, view, radius)
+    if path.endswith((".dot", ".gv")):
+        writeDot(path, ((key, label, colour) for key, (label, colour) in nodes.items()),
+                 ((source, target, label) for (source, target), label in edges.items()))
+        return
+    if nx is None:
+        raise ImportError("networkx and matplotlib are required to render images; export to .dot instead")
+    figure = Figure(figsize=(12, 9))
+    ax = figure.add_subplot(111)
+    G, pos, _ = drawWaitForGraph(ax, nodes, edges)
+    if len(nodes) <= LABEL_LIMIT:
+        nx.draw_networkx_edge_labels(G, pos, edge_labels={key: label for key, label in edges.items() if label},
+                                     font_size=8, ax=ax)
+    ax.set_title(f"Wait-For Graph ({view} view)")
+    ax.axis('off')
+    figure.savefig(path)
+
 class DeadlockDetectionApp:
     def __init__(self, root):
         global log_text, canvas
@@ -187,10 +782,31 @@ class DeadlockDetectionApp:
         
         ttk.Label(config_frame, text="Number of Processes:").grid(row=0, column=0, padx=5, pady=5)
         self.process_count_var = tk.IntVar(value=3)
-        ttk.Spinbox(config_frame, from_=2, to=10, textvariable=self.process_count_var).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Spinbox(config_frame, from_=2, to=100, textvariable=self.process_count_var).grid(row=0, column=1, padx=5, pady=5)
         
         ttk.Button(config_frame, text="Create Processes", command=self.create_processes).grid(row=0, column=2, padx=5, pady=5)
         
+        ttk.Label(config_frame, text="Probe Initiators:").grid(row=1, column=0, padx=5, pady=5)
+        self.policy_var = tk.StringVar(value="all_blocked")
+        ttk.Combobox(config_frame, values=INITIATION_POLICIES, textvariable=self.policy_var,
+                     state="readonly").grid(row=1, column=1, padx=5, pady=5)
+        # Only used by the "specified" policy
+        self.initiators_var = tk.StringVar(value="")
+        ttk.Entry(config_frame, textvariable=self.initiators_var, width=15).grid(row=1, column=2, padx=5, pady=5)
+        
+        ttk.Label(config_frame, text="Probe Workers:").grid(row=2, column=0, padx=5, pady=5)
+        self.workers_var = tk.IntVar(value=2)
+        ttk.Spinbox(config_frame, from_=1, to=16, textvariable=self.workers_var).grid(row=2, column=1, padx=5, pady=5)
+        # Probes only between sites, waits inside a site resolved locally
+        self.site_aware_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="Site-aware", variable=self.site_aware_var).grid(row=2, column=2, padx=5, pady=5)
+        
+        ttk.Label(config_frame, text="Graph View:").grid(row=3, column=0, padx=5, pady=5)
+        self.view_var = tk.StringVar(value="full")
+        view_box = ttk.Combobox(config_frame, values=GRAPH_VIEWS, textvariable=self.view_var, state="readonly")
+        view_box.grid(row=3, column=1, padx=5, pady=5)
+        view_box.bind("<<ComboboxSelected>>", lambda event: self.update_graph())
+        
         # Process dependency setup
         self.dependency_frame = ttk.LabelFrame(self.left_frame, text="Process Dependencies", padding=10)
         self.dependency_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -202,6 +818,11 @@ class DeadlockDetectionApp:
         log_text = scrolledtext.ScrolledText(log_frame, width=50, height=15)
         log_text.pack(fill=tk.BOTH, expand=True)
         
+        # Worker threads only append to the buffer; the Tk thread drains it
+        self.log_buffer = RingBufferSink()
+        event_log.sinks = [self.log_buffer]
+        self.root.after(250, self.flush_log)
+        
         # Control buttons
         control_frame = ttk.Frame(self.left_frame)
         control_frame.pack(fill=tk.X, pady=10)
@@ -209,6 +830,7 @@ class DeadlockDetectionApp:
         ttk.Button(control_frame, text="Run Detection", command=self.run_detection).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Print State", command=print_system_state).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Update Graph", command=self.update_graph).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Export Graph", command=self.export_graph).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Clear", command=self.clear_all).pack(side=tk.LEFT, padx=5)
         
         # Graph display area
@@ -229,14 +851,41 @@ class DeadlockDetectionApp:
         self.dependency_widgets = []
         self.process_data = []
         
-        # Start the dispatcher thread
-        self.dispatcher_thread = None
+        # Worker pool delivering probes, created for each detection run
+        self.scheduler = None
+        # Schedulers whose probes have all been handled, queued by the worker
+        # that finished last and reported from flush_log in the Tk thread
+        self.drained_runs = queue.Queue()
+        
+        # Cached drawing of the wait-for graph, see update_graph
+        self.graph = None
+        self.graph_topology = None
+        self.graph_pos = {}
+        self.graph_nodes = []
+        self.graph_edge_labels = {}
+        self.node_artist = None
+        self.edge_label_artists = {}
         
         # Initial empty graph
         self.init_graph()
     
+    def flush_log(self):
+        """Move buffered log records into the log widget and report finished runs"""
+        records = self.log_buffer.drain()
+        if records:
+            log_text.insert(tk.END, "".join(format_event(record) + "\n" for record in records))
+            log_text.see(tk.END)
+        while True:
+            try:
+                scheduler = self.drained_runs.get_nowait()
+            except queue.Empty:
+                break
+            self.on_probes_drained(scheduler)
+        self.root.after(250, self.flush_log)
+    
     def init_graph(self):
         """Initialize an empty graph"""
+        self.graph_topology = None
         self.ax.clear()
         self.ax.set_title("Wait-For Graph")
         self.ax.text(0.5, 0.5, "Create processes and run detection to see the graph",
@@ -246,9 +895,9 @@ class DeadlockDetectionApp:
         self.canvas_widget.draw()
     
     def create_processes(self):
-        global process_list, ProbeQueue
+        global process_list
         process_list = []
-        ProbeQueue = []
+        clear_probe_queue()
         
         # Clear the dependency frame
         for widget in self.dependency_widgets:
@@ -309,93 +958,102 @@ class DeadlockDetectionApp:
             self.init_graph()
             return
         
-        # Clear the current axis
-        self.ax.clear()
-        
-        # Create directed graph
-        G = nx.DiGraph()
-        
-        # Add all nodes first
-        for p in process_list:
-            node_label = f"P{p.pid}\nSite{p.sid}"
-            G.add_node(node_label)
-        
-        # Add edges based on waiting relationships
-        for p in process_list:
-            for wait_pid in p.isWaitingOn:
-                if wait_pid < len(process_list):  # Ensure valid index
-                    G.add_edge(f"P{p.pid}\nSite{p.sid}", f"P{wait_pid}\nSite{process_list[wait_pid].sid}")
+        # Layout and edges are only redrawn when the view's topology changes;
+        # otherwise just the node colours and probe labels of the cached drawing change
+        view = self.view_var.get()
+        nodes, edges = graph_view(process_list, view)
+        topology = (view, tuple((key, label) for key, (label, _) in nodes.items()), frozenset(edges))
+        if topology != self.graph_topology:
+            self.draw_topology(topology, nodes, edges)
         
         # Set node colors based on process state
-        node_colors = []
-        for node in G.nodes():
-            pid = int(node.split('\n')[0][1:])  # Extract pid from "P{pid}\nSite{sid}"
-            if process_list[pid].deadlockDetected:
-                node_colors.append('red')
-            elif process_list[pid].isBlocked:
-                node_colors.append('orange')
-            else:
-                node_colors.append('lightblue')
+        self.node_artist.set_facecolor([nodes[key][1] for key in self.graph_nodes])
         
-        # Create a spring layout
-        pos = nx.spring_layout(G)
+        # Add edge labels showing probe info, or wait counts between sites
+        if len(nodes) > LABEL_LIMIT:
+            edge_labels = {}
+        elif view == "sites":
+            edge_labels = edges
+        else:
+            edge_labels = {}
+            for p in process_list:
+                for probe in p.probeSendQueue:
+                    sender = probe.sender
+                    receiver = probe.receiver
+                    origin = probe.origin
+                    key = (sender, receiver)
+                    if key in edge_labels:
+                        edge_labels[key] += f",({origin},{sender},{receiver})"
+                    else:
+                        edge_labels[key] = f"({origin},{sender},{receiver})"
         
-        # Draw the graph
-        nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=1000, ax=self.ax)
-        nx.draw_networkx_edges(G, pos, arrowsize=20, ax=self.ax)
-        nx.draw_networkx_labels(G, pos, font_size=9, font_weight='bold', ax=self.ax)
+        if edge_labels != self.graph_edge_labels:
+            for artist in self.edge_label_artists.values():
+                artist.remove()
+            # Only label pairs that are drawn as edges
+            drawable = {key: label for key, label in edge_labels.items() if self.graph.has_edge(*key)}
+            self.edge_label_artists = nx.draw_networkx_edge_labels(self.graph, self.graph_pos, edge_labels=drawable,
+                                                                   font_size=8, ax=self.ax)
+            self.graph_edge_labels = edge_labels
         
-        # Add edge labels showing probe info
-        edge_labels = {}
-        for p in process_list:
-            for probe in p.probeSendQueue:
-                sender = probe.sender.pid
-                receiver = probe.receiver.pid
-                origin = probe.origin.pid
-                key = (f"P{sender}\nSite{probe.sender.sid}", f"P{receiver}\nSite{probe.receiver.sid}")
-                if key in edge_labels:
-                    edge_labels[key] += f",({origin},{sender},{receiver})"
-                else:
-                    edge_labels[key] = f"({origin},{sender},{receiver})"
+        # Update canvas
+        self.canvas_widget.draw_idle()
+        log_message("Graph visualization updated")
+    
+    def draw_topology(self, topology, nodes, edges):
+        """Lay out and draw the nodes and edges of a new wait-for graph"""
+        self.ax.clear()
         
-        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8, ax=self.ax)
+        # Nodes that were already drawn start from their old position so the
+        # picture stays stable when processes or edges are added
+        initial = {key: xy for key, xy in self.graph_pos.items() if key in nodes}
+        if self.graph_topology is not None and self.graph_topology[0] != topology[0]:
+            initial = {}
+        self.graph, self.graph_pos, self.node_artist = drawWaitForGraph(self.ax, nodes, edges, initial)
+        self.graph_nodes = list(self.graph.nodes())
         
         # Set title and disable axes
-        self.ax.set_title("Wait-For Graph with Probe Information")
+        self.ax.set_title(f"Wait-For Graph with Probe Information ({topology[0]} view)")
         self.ax.axis('off')
-        
-        # Update canvas
         self.figure.tight_layout()
-        self.canvas_widget.draw()
-        log_message("Graph visualization updated")
+        
+        self.graph_topology = topology
+        self.graph_edge_labels = {}
+        self.edge_label_artists = {}
+    
+    def export_graph(self):
+        """Save the current view of the graph to a file"""
+        if not process_list:
+            messagebox.showinfo("Export Graph", "Create processes first")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Graph", defaultextension=".svg",
+            filetypes=[("SVG image", "*.svg"), ("PNG image", "*.png"), ("GraphViz DOT", "*.dot")])
+        if not path:
+            return
+        export_graph(path, process_list, self.view_var.get())
+        log_message(f"Graph exported to {path}")
     
     def run_detection(self):
-        global process_list, running, ProbeQueue
+        global process_list, probe_router
         
         if not self.process_data:
             messagebox.showinfo("Error", "Please create processes first")
             return
         
+        # Stop the workers of a previous run before replacing the processes
+        self.stop_scheduler()
+        
         # Initialize processes
         process_list = []
-        ProbeQueue = []
-        process_count = self.process_count_var.get()
+        clear_probe_queue()
         
         log_message("Creating processes...")
         
+        records = []
         for i, (site_var, blocked_var, waiting_var) in enumerate(self.process_data):
-            site_id = site_var.get()
-            is_blocked = blocked_var.get()
-            waiting_on = self.parse_waiting_on(waiting_var.get())
-            
-            process = Process(
-                pid=i,
-                sid=site_id,
-                process_count=process_count,
-                isBlocked=is_blocked,
-                isWaitingOn=waiting_on
-            )
-            process_list.append(process)
+            records.append((i, site_var.get(), blocked_var.get(), self.parse_waiting_on(waiting_var.get())))
+        process_list = build_processes(records)
         
         log_message("All processes created")
         
@@ -403,14 +1061,13 @@ class DeadlockDetectionApp:
         for p in process_list:
             for wait_pid in p.isWaitingOn:
                 if wait_pid < len(process_list):
-                    process_list[wait_pid].dependent[p.pid] = False
+                    process_list[wait_pid].removeDependent(p.pid)
         
-        # Start the dispatcher thread if not already running
-        if not self.dispatcher_thread or not self.dispatcher_thread.is_alive():
-            running = True
-            self.dispatcher_thread = threading.Thread(target=ProbeDispatcher, daemon=True)
-            self.dispatcher_thread.start()
-            log_message("Dispatcher thread started")
+        # The last worker to finish a probe reports back to the Tk thread
+        scheduler = MailboxScheduler(self.workers_var.get())
+        scheduler.termination.on_quiescent = lambda: self.drained_runs.put(scheduler)
+        self.scheduler = scheduler
+        probe_router = scheduler
         
         # Print initial state
         print_system_state()
@@ -420,43 +1077,59 @@ class DeadlockDetectionApp:
         
         # Start deadlock detection
         log_message("Starting deadlock detection...")
-        for p in process_list:
-            for other_p in process_list:
-                p.sendProbe(initiator=p, sender=p, receiver=other_p)
+        start_detection(self.policy_var.get(), self.parse_waiting_on(self.initiators_var.get()),
+                        self.site_aware_var.get())
         
-        # Run detector for a short time
-        self.root.after(2000, self.check_deadlock)
+        # Without any probe posted the run is already over and on_quiescent
+        # will never fire; otherwise only on_quiescent reports the result
+        if scheduler.termination.is_quiescent():
+            self.check_deadlock()
+            return
+        scheduler.start()
+        log_message(f"Started {scheduler.workers} probe worker(s)")
+    
+    def on_probes_drained(self, scheduler):
+        # Ignore a late notification from a run that has been replaced
+        if scheduler is not self.scheduler:
+            return
+        if scheduler.error is not None:
+            log_message(f"Probe handling failed: {scheduler.error!r}", WARNING)
+            messagebox.showerror("Detection Failed", f"Probe handling failed: {scheduler.error}")
+            return
+        self.check_deadlock()
     
     def check_deadlock(self):
-        deadlock_detected = False
-        for p in process_list:
-            if p.deadlockDetected:
-                deadlock_detected = True
-                break
-        
-        if deadlock_detected:
+        """Report the final result once every probe has been consumed"""
+        if any(p.deadlockDetected for p in process_list):
             log_message("DEADLOCK DETECTED in the system!")
             messagebox.showinfo("Detection Result", "Deadlock detected!")
         else:
-            log_message("No deadlock detected yet, continuing...")
-            self.root.after(2000, self.check_deadlock)
+            log_message("All probes drained, no deadlock in the system")
+            messagebox.showinfo("Detection Result", "No deadlock detected")
         
         # Update the graph and system state
         print_system_state()
         self.update_graph()
     
+    def stop_scheduler(self):
+        global probe_router
+        if self.scheduler:
+            self.scheduler.stop()
+        self.scheduler = None
+        probe_router = None
+    
     def clear_all(self):
-        global process_list, ProbeQueue, running
+        global process_list
         process_list = []
-        ProbeQueue = []
         
-        # Stop the dispatcher thread
-        running = False
-        if self.dispatcher_thread and self.dispatcher_thread.is_alive():
-            self.dispatcher_thread.join(timeout=1.0)
-            log_message("Dispatcher thread stopped")
+        # Stop the probe workers
+        if self.scheduler:
+            self.stop_scheduler()
+            log_message("Probe workers stopped")
+        clear_probe_queue()
         
         # Clear log
+        self.log_buffer.drain()
         log_text.delete(1.0, tk.END)
         
         # Clear graph
@@ -470,10 +1143,56 @@ class DeadlockDetectionApp:
         
         log_message("System cleared")
 
+def add_log_argument(parser, default="info"):
+    """Add the --log-level option"""
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default=default,
+                        help="'trace' logs every probe")
+
+def add_engine_arguments(parser):
+    """Add the options every command line front end of the engine shares"""
+    parser.add_argument("--policy", choices=INITIATION_POLICIES, default="all_blocked",
+                        help="which processes start probes")
+    parser.add_argument("--initiators", type=int, nargs="*", default=[],
+                        help="initiator pids for the 'specified' policy")
+    parser.add_argument("--site-aware", action="store_true",
+                        help="send probes only between sites and resolve waits inside a site locally")
+    add_log_argument(parser)
+
+def configure_cli_logging(args):
+    """Log at the requested level to stderr, keeping stdout for the JSON result"""
+    event_log.set_level(LOG_LEVELS[args.log_level])
+    event_log.sinks = [StreamSink(sys.stderr)]
+
+def run_batch(path, policy="all_blocked", initiators=None, export=None, view="full", site_aware=False):
+    """Run detection on a JSON file of [pid, sid, blocked, waiting_on] records"""
+    with open(path) as f:
+        records = json.load(f)
+    result = run_headless(records, policy, initiators, site_aware=site_aware)
+    print(json.dumps(result))
+    if export:
+        export_graph(export, process_list, view)
+    return result
+
 def main():
+    parser = argparse.ArgumentParser(description="Chandy-Misra-Haas deadlock detection")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run headless on a JSON list of [pid, sid, blocked, waiting_on] records")
+    add_engine_arguments(parser)
+    parser.add_argument("--export", metavar="FILE",
+                        help="with --batch, save the graph after detection to a .dot, .svg or .png file")
+    parser.add_argument("--view", choices=GRAPH_VIEWS, default="full",
+                        help="which part of the graph --export draws")
+    args = parser.parse_args()
+    if args.batch:
+        configure_cli_logging(args)
+        run_batch(args.batch, args.policy, args.initiators, args.export, args.view, args.site_aware)
+        return
+    if tk is None or nx is None:
+        raise SystemExit("tkinter, networkx and matplotlib are required for the GUI; use --batch to run headless")
+    event_log.set_level(LOG_LEVELS[args.log_level])
     root = tk.Tk()
     app = DeadlockDetectionApp(root)
-    root.protocol("WM_DELETE_WINDOW", lambda: (setattr(globals(), "running", False), root.destroy()))
+    root.protocol("WM_DELETE_WINDOW", lambda: (app.stop_scheduler(), root.destroy()))
     root.mainloop()
 
 if __name__ == "__main__":
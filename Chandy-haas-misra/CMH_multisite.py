@@ -0,0 +1,251 @@
+"""Run the Chandy-Misra-Haas engine with every site in its own OS process.
+
+Each site process holds only its own Process objects. Probes between processes
+of the same site are delivered locally, probes to another site are packed into
+one ProbeBatch envelope per destination site and the envelope is pickled onto
+that site's multiprocessing queue. A probe whose (origin, receiver) pair was
+already sent is dropped, since the receiver ignores it after the first one.
+Termination is detected with a shared count of outstanding work: every site
+starts with one unit for its initial probes, every inter-site message adds one
+before it is sent, and a unit is released only after the message and all the
+local probes it caused have been handled.
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import time
+from collections import deque
+
+import CMH_diff_sites as cmh
+
+# Seconds between checks that every site process is still alive
+SITE_POLL_INTERVAL = 0.1
+
+
+class RemoteProcess:
+    """Stand-in for a process that lives on another site"""
+    __slots__ = ("pid", "sid")
+
+    def __init__(self, pid, sid):
+        self.pid = pid
+        self.sid = sid
+
+    def add_event_listener(self, event_name, handler):
+        # The owning site registers its own listener when the probe arrives
+        pass
+
+    def receiveProbe(self, probe):
+        raise RuntimeError(f"Process {self.pid} lives on site {self.sid}")
+
+    receiveSiteProbe = receiveProbe
+
+
+class SiteRouter:
+    """Probe transport of one site: local queue plus batched outboxes to other sites
+
+    An outbox is sent when it holds batch_size probes, when its first probe
+    has waited batch_window seconds, or when the site runs out of local work.
+    """
+    def __init__(self, sid, site_of, inboxes, outstanding, batch_size=256, batch_window=0.01):
+        self.sid = sid
+        self.site_of = site_of
+        self.inboxes = inboxes
+        self.outstanding = outstanding
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.local = deque()
+        self.outboxes = {}
+        self.opened = {}
+        # (origin, receiver) pairs already sent to another site
+        self.forwarded = set()
+        self.local_messages = 0
+        self.remote_messages = 0
+        self.remote_probes = 0
+        self.dropped_probes = 0
+
+    def deliver(self, probe):
+        destination = self.site_of[probe.receiver]
+        if destination == self.sid:
+            self.local_messages += 1
+            self.local.append(probe)
+            return
+        # After the first probe of an origin the receiver either depends on
+        # that origin or is not blocked, and discards every later one
+        key = (probe.origin, probe.receiver)
+        if key in self.forwarded:
+            self.dropped_probes += 1
+            return
+        self.forwarded.add(key)
+        batch = self.outboxes.get(destination)
+        if batch is None:
+            batch = self.outboxes[destination] = cmh.ProbeBatch()
+            self.opened[destination] = time.monotonic()
+        batch.append(probe)
+        if len(batch) >= self.batch_size or time.monotonic() - self.opened[destination] >= self.batch_window:
+            self.send(destination)
+
+    def send(self, destination):
+        """Send the outbox of one destination site as a single message"""
+        batch = self.outboxes.pop(destination)
+        del self.opened[destination]
+        self.remote_messages += 1
+        self.remote_probes += len(batch)
+        with self.outstanding.get_lock():
+            self.outstanding.value += 1
+        self.inboxes[destination].put(batch)
+
+    def drain(self):
+        """Handle local probes until the site has nothing left to do, then send the outboxes"""
+        while self.local:
+            cmh.handle_probe(self.local.popleft())
+        for destination in list(self.outboxes):
+            self.send(destination)
+
+
+def _release(outstanding, done):
+    with outstanding.get_lock():
+        outstanding.value -= 1
+        if outstanding.value == 0:
+            done.set()
+
+
+def _run_site(sid, records, site_of, initiators, inboxes, results, outstanding, done, log_level, site_aware,
+              batch_size, batch_window):
+    """Body of one site process"""
+    cmh.event_log.set_level(log_level)
+    cmh.event_log.sinks = [cmh.StreamSink(sys.stderr)]
+    local = {pid for pid, _, _, _ in records}
+    processes = [RemoteProcess(pid, site) for pid, site in enumerate(site_of)]
+    for pid, _, blocked, waiting_on in records:
+        processes[pid] = cmh.Process(pid=pid, sid=sid, process_count=len(site_of),
+                                     isBlocked=bool(blocked), isWaitingOn=list(waiting_on))
+    router = SiteRouter(sid, site_of, inboxes, outstanding, batch_size, batch_window)
+    cmh.process_list = processes
+    cmh.probe_router = router
+
+    cmh.start_detection("specified", initiators, site_aware)
+    router.drain()
+    _release(outstanding, done)
+
+    inbox = inboxes[sid]
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        for probe in batch:
+            Pr = processes[probe.receiver]
+            Pr.add_event_listener('receiveProbe', Pr.receiveSiteProbe if site_aware else Pr.receiveProbe)
+            Pr.trigger_event('receiveProbe', probe)
+        router.drain()
+        _release(outstanding, done)
+
+    owned = [processes[pid] for pid in sorted(local)]
+    results.put({
+        "sid": sid,
+        "deadlocked": [p.pid for p in owned if p.deadlockDetected],
+        "probes_sent": sum(p.probeSentCount for p in owned),
+        "probes_received": sum(p.probeReceiveCount for p in owned),
+        "local_messages": router.local_messages,
+        "inter_site_messages": router.remote_messages,
+        "inter_site_probes": router.remote_probes,
+        "dropped_probes": router.dropped_probes,
+    })
+
+
+def _check_sites(workers):
+    """Raise if a site process has died; a site only exits on its own after sending its result"""
+    for worker in workers:
+        if worker.exitcode not in (None, 0):
+            raise RuntimeError(f"{worker.name} exited with code {worker.exitcode}")
+
+
+def run_multisite(records, policy="all_blocked", initiators=None, site_aware=False,
+                  batch_size=256, batch_window=0.01):
+    """Run a detection with one OS process per site and return its result
+
+    With site_aware only waits between sites cost a message; each site
+    resolves the waits among its own processes locally. batch_size and
+    batch_window bound how long probes for another site are held back to
+    share one message; a batch_size of 1 sends every probe on its own.
+    """
+    # The coordinator only needs the full graph to pick the initiators
+    cmh.process_list = cmh.build_processes(records)
+    initiator_pids = set(cmh.select_initiators(policy, initiators))
+    site_of = [p.sid for p in cmh.process_list]
+    site_records = {}
+    for record in records:
+        site_records.setdefault(record[1], []).append(tuple(record))
+
+    context = multiprocessing.get_context()
+    inboxes = {sid: context.Queue() for sid in site_records}
+    results = context.Queue()
+    outstanding = context.Value('q', len(site_records))
+    done = context.Event()
+    # Without sites no work is ever released, so there is nothing to wait for
+    if not site_records:
+        done.set()
+    workers = []
+    try:
+        for sid, local_records in site_records.items():
+            local_initiators = sorted(pid for pid, _, _, _ in local_records if pid in initiator_pids)
+            worker = context.Process(target=_run_site, name=f"Site {sid}",
+                                     args=(sid, local_records, site_of, local_initiators,
+                                           inboxes, results, outstanding, done,
+                                           cmh.event_log.level, site_aware,
+                                           batch_size, batch_window))
+            worker.start()
+            workers.append(worker)
+
+        # A site that dies never releases its work, so keep checking on them
+        while not done.wait(SITE_POLL_INTERVAL):
+            _check_sites(workers)
+        for inbox in inboxes.values():
+            inbox.put(None)
+        site_results = []
+        while len(site_results) < len(workers):
+            try:
+                site_results.append(results.get(timeout=SITE_POLL_INTERVAL))
+            except queue.Empty:
+                _check_sites(workers)
+        site_results.sort(key=lambda result: result["sid"])
+    except BaseException:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+
+    return {
+        "deadlocked": sorted(pid for result in site_results for pid in result["deadlocked"]),
+        "probes_sent": sum(result["probes_sent"] for result in site_results),
+        "probes_received": sum(result["probes_received"] for result in site_results),
+        "local_messages": sum(result["local_messages"] for result in site_results),
+        "inter_site_messages": sum(result["inter_site_messages"] for result in site_results),
+        "inter_site_probes": sum(result["inter_site_probes"] for result in site_results),
+        "dropped_probes": sum(result["dropped_probes"] for result in site_results),
+        "sites": site_results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chandy-Misra-Haas detection with one OS process per site")
+    parser.add_argument("file", help="JSON list of [pid, sid, blocked, waiting_on] records")
+    cmh.add_engine_arguments(parser)
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="most probes sent to another site in one message")
+    parser.add_argument("--batch-window", type=float, default=0.01,
+                        help="seconds a probe may wait for others headed to the same site")
+    args = parser.parse_args()
+    cmh.configure_cli_logging(args)
+    with open(args.file) as f:
+        records = json.load(f)
+    print(json.dumps(run_multisite(records, args.policy, args.initiators, args.site_aware,
+                                   args.batch_size, args.batch_window)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Centralized NumPy oracle for auditing Chandy-Misra-Haas results.
+
+Given a snapshot of the processes it computes in bulk which of them a
+complete all_blocked run of the CMH engine declares deadlocked: every blocked
+process that lies on a cycle of waits between blocked processes. Processes
+that nothing waits on, or that wait on nothing, are trimmed first. The rest
+are resolved with the transitive closure of the Boolean adjacency matrix
+when they are few. Otherwise weakly connected components that are a single
+cycle are resolved at once, and the others with forward-backward strongly
+connected component search, each reachability pass a frontier BFS over CSR
+arrays.
+
+The snapshot must be taken before detection runs: declareDeadlock adds a
+self-wait to every process it flags, which the oracle would count as a cycle.
+So there is no default to the engine's process_list, and audit rebuilds the
+processes from the records the run started from.
+"""
+import argparse
+import json
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import CMH_diff_sites as cmh
+
+ORACLE_METHODS = ("auto", "matrix", "forward_backward")
+# Up to this many processes left after trimming the dense closure is used
+MATRIX_LIMIT = 256
+# Each vectorized trimming round peels only one layer off chains, so after a
+# few rounds the rest is peeled one process at a time
+TRIM_ROUNDS = 8
+# BFS levels smaller than this are expanded in plain Python, which is cheaper
+# than array calls on long paths and rings where every level is one node
+SERIAL_FRONTIER = 64
+
+
+def blocked_wait_edges(processes):
+    """Waits between blocked processes as (sources, targets) pid arrays"""
+    count = len(processes)
+    blocked = numpy.fromiter((p.isBlocked for p in processes), dtype=bool, count=count)
+    lengths = numpy.fromiter((len(p.isWaitingOn) for p in processes), dtype=numpy.int64, count=count)
+    targets = numpy.fromiter((pid for p in processes for pid in p.isWaitingOn), dtype=numpy.int64,
+                             count=int(lengths.sum()))
+    sources = numpy.repeat(numpy.arange(count, dtype=numpy.int64), lengths)
+    # Waits on unknown pids are ignored, as the engine does
+    valid = (targets >= 0) & (targets < count)
+    sources, targets = sources[valid], targets[valid]
+    between_blocked = blocked[sources] & blocked[targets]
+    return sources[between_blocked], targets[between_blocked]
+
+
+def trim(count, sources, targets):
+    """Drop processes with no waiter or nothing to wait on; they lie on no cycle"""
+    for _ in range(TRIM_ROUNDS):
+        alive = (numpy.bincount(sources, minlength=count) > 0) & (numpy.bincount(targets, minlength=count) > 0)
+        keep = alive[sources] & alive[targets]
+        if keep.all():
+            return sources, targets
+        sources, targets = sources[keep], targets[keep]
+    return peel(count, sources, targets)
+
+
+def peel(count, sources, targets):
+    """Trim to the end, removing one process at a time as its last waiter or wait goes"""
+    out_degree = numpy.bincount(sources, minlength=count).tolist()
+    in_degree = numpy.bincount(targets, minlength=count).tolist()
+    _, _, forward_start, forward = csr(count, sources, targets)
+    _, _, backward_start, backward = csr(count, targets, sources)
+    removed = numpy.zeros(count, dtype=bool)
+    stack = numpy.flatnonzero((numpy.array(out_degree) == 0) != (numpy.array(in_degree) == 0)).tolist()
+    while stack:
+        node = stack.pop()
+        if removed[node]:
+            continue
+        removed[node] = True
+        for target in forward[forward_start[node]:forward_start[node + 1]]:
+            in_degree[target] -= 1
+            if not in_degree[target]:
+                stack.append(target)
+        for source in backward[backward_start[node]:backward_start[node + 1]]:
+            out_degree[source] -= 1
+            if not out_degree[source]:
+                stack.append(source)
+    keep = ~(removed[sources] | removed[targets])
+    return sources[keep], targets[keep]
+
+
+def weak_components(count, sources, targets):
+    """Smallest node of the weakly connected component of every node"""
+    parent = numpy.arange(count, dtype=numpy.int64)
+    while True:
+        # Hook the larger root of every edge onto the smaller one, then jump
+        # pointers until every node points at its root again
+        ends = numpy.sort(numpy.stack((parent[sources], parent[targets])), axis=0)
+        split = ends[0] != ends[1]
+        if not split.any():
+            return parent
+        numpy.minimum.at(parent, ends[1][split], ends[0][split])
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def matrix_on_cycle(count, sources, targets):
+    """Per node, whether it reaches itself, from the Boolean transitive closure"""
+    reach = numpy.zeros((count, count), dtype=bool)
+    reach[sources, targets] = True
+    # Squaring doubles the path length covered, so this takes log2(count) products
+    while True:
+        weights = reach.astype(numpy.float32)
+        closed = reach | (weights @ weights > 0)
+        if numpy.array_equal(closed, reach):
+            return numpy.diagonal(reach).copy()
+        reach = closed
+
+
+def csr(count, sources, targets):
+    """(indptr, indices) of the edges grouped by source, as arrays and as lists"""
+    order = numpy.argsort(sources, kind="stable")
+    indptr = numpy.zeros(count + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sources, minlength=count), out=indptr[1:])
+    indices = targets[order]
+    return indptr, indices, indptr.tolist(), indices.tolist()
+
+
+def frontier_reach(graph, start, colour, visited):
+    """Nodes of start's colour reachable from start, found one BFS level at a time"""
+    indptr, indices, indptr_list, indices_list = graph
+    wanted = colour[start]
+    visited[start] = True
+    reached = [[start]]
+    frontier = [start]
+    while len(frontier):
+        if len(frontier) < SERIAL_FRONTIER:
+            neighbours = []
+            for node in frontier:
+                for neighbour in indices_list[indptr_list[node]:indptr_list[node + 1]]:
+                    if not visited[neighbour] and colour[neighbour] == wanted:
+                        visited[neighbour] = True
+                        neighbours.append(neighbour)
+        else:
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            # Positions of every out-edge of the frontier, gathered in one step
+            offsets = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) + numpy.arange(int(counts.sum()))
+            neighbours = indices[offsets]
+            neighbours = numpy.unique(neighbours[(colour[neighbours] == wanted) & ~visited[neighbours]])
+            visited[neighbours] = True
+        reached.append(neighbours)
+        frontier = numpy.asarray(neighbours, dtype=numpy.int64) if len(neighbours) >= SERIAL_FRONTIER else neighbours
+    nodes = numpy.concatenate([numpy.asarray(level, dtype=numpy.int64) for level in reached])
+    visited[nodes] = False
+    return nodes
+
+
+def forward_backward_on_cycle(count, sources, targets):
+    """Per node, whether its strongly connected component holds a cycle"""
+    on_cycle = numpy.zeros(count, dtype=bool)
+    # A weak component where every node has exactly one in and one out edge
+    # is a single cycle; the others are searched one component at a time
+    colour = weak_components(count, sources, targets)
+    irregular = (numpy.bincount(sources, minlength=count) != 1) | (numpy.bincount(targets, minlength=count) != 1)
+    simple = numpy.bincount(colour, weights=irregular, minlength=count)[colour] == 0
+    on_cycle[simple] = True
+    rest = numpy.flatnonzero(~simple)
+    rest = rest[numpy.argsort(colour[rest], kind="stable")]
+    subsets = numpy.split(rest, numpy.flatnonzero(numpy.diff(colour[rest])) + 1) if rest.size else []
+
+    forward = csr(count, sources, targets)
+    backward = csr(count, targets, sources)
+    self_wait = numpy.zeros(count, dtype=bool)
+    self_wait[sources[sources == targets]] = True
+    # Nodes still to be resolved share a colour with the others of their subset
+    visited = numpy.zeros(count, dtype=bool)
+    side = numpy.zeros(count, dtype=numpy.int8)
+    next_colour = count
+    # Random pivots split long paths near the middle on average
+    pivots = numpy.random.default_rng(0)
+    while subsets:
+        members = subsets.pop()
+        if members.size == 1:
+            on_cycle[members[0]] = self_wait[members[0]]
+            continue
+        pivot = int(members[pivots.integers(members.size)])
+        # The pivot's component is what it both reaches and is reached from;
+        # every other component lies wholly in one of the three remainders
+        side[frontier_reach(forward, pivot, colour, visited)] |= 1
+        side[frontier_reach(backward, pivot, colour, visited)] |= 2
+        sides = side[members]
+        side[members] = 0
+        component = members[sides == 3]
+        on_cycle[component] = component.size > 1 or self_wait[pivot]
+        for label in (0, 1, 2):
+            rest = members[sides == label]
+            if rest.size:
+                colour[rest] = next_colour
+                next_colour += 1
+                subsets.append(rest)
+    return on_cycle
+
+
+def deadlocked_processes(processes, method="auto"):
+    """Sorted pids that a complete all_blocked CMH run declares deadlocked"""
+    if numpy is None:
+        raise ImportError("numpy is required for the deadlock oracle")
+    if method not in ORACLE_METHODS:
+        raise ValueError(f"Unknown oracle method {method!r}, expected one of {ORACLE_METHODS}")
+    sources, targets = trim(len(processes), *blocked_wait_edges(processes))
+    # Renumber the processes that survived trimming to 0..count-1
+    pids, compact = numpy.unique(numpy.concatenate((sources, targets)), return_inverse=True)
+    count = pids.size
+    sources, targets = compact[:sources.size], compact[sources.size:]
+    if method == "matrix" or (method == "auto" and count <= MATRIX_LIMIT):
+        on_cycle = matrix_on_cycle(count, sources, targets)
+    else:
+        on_cycle = forward_backward_on_cycle(count, sources, targets)
+    return pids[on_cycle].tolist()
+
+
+def audit(result, records, method="auto"):
+    """Compare the deadlocked pids of an all_blocked CMH result with the oracle on its input records"""
+    expected = deadlocked_processes(cmh.build_processes(records), method)
+    reported = set(result["deadlocked"])
+    return {
+        "agrees": reported == set(expected),
+        "missed": [pid for pid in expected if pid not in reported],
+        "unexpected": sorted(reported.difference(expected)),
+        "deadlocked": expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy oracle for Chandy-Misra-Haas deadlock detection")
+    parser.add_argument("file", help="JSON list of [pid, sid, blocked, waiting_on] records")
+    parser.add_argument("--method", choices=ORACLE_METHODS, default="auto")
+    parser.add_argument("--audit", action="store_true",
+                        help="also run the CMH engine on the records and compare its answer")
+    cmh.add_log_argument(parser, default="warning")
+    args = parser.parse_args()
+    cmh.configure_cli_logging(args)
+    with open(args.file) as f:
+        records = json.load(f)
+    processes = cmh.build_processes(records)
+    started = time.perf_counter()
+    deadlocked = deadlocked_processes(processes, args.method)
+    output = {"deadlocked": deadlocked, "oracle_time": time.perf_counter() - started}
+    if args.audit:
+        started = time.perf_counter()
+        result = cmh.run_headless(records)
+        output["cmh_time"] = time.perf_counter() - started
+        output.update(audit(result, records, args.method))
+    print(json.dumps(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,120 @@
-import networkx as nx
-import matplotlib.pyplot as plt
+import mmap
+import struct
+import sys
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy=None
+# Only needed to draw the graph, so headless servers can run without them
+try:
+    import networkx as nx
+    import matplotlib.pyplot as plt
+except ImportError:
+    nx=None
+    plt=None
+
+# Binary edge file: magic, node count, edge count, then one little-endian
+# int32 (waiter, holder) pair per edge
+EDGE_FILE_MAGIC=b"WFG1"
+EDGE_FILE_HEADER=struct.Struct("<4sIQ")
+# Larger drawings leave out labels and arrows
+LABEL_LIMIT=40
+# Larger drawings are laid out on a circle
+SPRING_LIMIT=400
+
+class CSRGraph:
+    # Wait-for graph stored as two flat integer arrays: the processes node u
+    # waits on are targets[offsets[u]:offsets[u+1]]. Indexing returns a
+    # memoryview slice, so the detector can walk it like an adjacency list
+    # without any per-edge Python objects (4 bytes per edge, 8 per node).
+    def __init__(self,nodes,offsets,targets):
+        self.nodes=nodes
+        self.offsets=offsets
+        self.targets=targets
+        self._offsets=memoryview(offsets)
+        self._targets=memoryview(targets)
+
+    def __len__(self):
+        return self.nodes
+
+    def __getitem__(self,node):
+        return self._targets[self._offsets[node]:self._offsets[node+1]]
+
+    def edgeCount(self):
+        return len(self.targets)
+
+    @classmethod
+    def fromAdjList(cls,adjList):
+        offsets=array('q',[0])
+        targets=array('i')
+        for waitsOn in adjList:
+            targets.extend(waitsOn)
+            offsets.append(len(targets))
+        return cls(len(adjList),offsets,targets)
+
+    @classmethod
+    def fromEdges(cls,sources,targets,nodes=None):
+        # sources[k] waits on targets[k]; both are integer arrays of equal length
+        if len(sources)!=len(targets):
+            raise ValueError("sources and targets must have the same length")
+        if numpy is not None:
+            return cls._fromEdgesNumpy(sources,targets,nodes)
+        if nodes is None:
+            nodes=max(max(sources,default=-1),max(targets,default=-1))+1
+        # Counting sort on the source id: one pass for the degrees, one to scatter
+        offsets=array('q',bytes(8*(nodes+1)))
+        for u in sources:
+            offsets[u+1]+=1
+        for i in range(nodes):
+            offsets[i+1]+=offsets[i]
+        position=array('q',offsets)
+        sortedTargets=array('i',bytes(4*len(targets)))
+        for u,v in zip(sources,targets):
+            sortedTargets[position[u]]=v
+            position[u]+=1
+        return cls(nodes,offsets,sortedTargets)
+
+    @classmethod
+    def _fromEdgesNumpy(cls,sources,targets,nodes):
+        # Integer arrays are used as they are, anything else (lists) is converted once
+        sources=numpy.asarray(sources)
+        targets=numpy.asarray(targets)
+        if sources.dtype.kind not in 'iu':
+            sources=sources.astype(numpy.int64)
+        if nodes is None:
+            nodes=int(max(sources.max(initial=-1),targets.max(initial=-1)))+1
+        counts=numpy.bincount(sources,minlength=nodes)
+        offsets=numpy.zeros(nodes+1,dtype=numpy.int64)
+        numpy.cumsum(counts,out=offsets[1:])
+        order=numpy.argsort(sources,kind='stable')
+        sortedTargets=numpy.ascontiguousarray(targets[order],dtype=numpy.int32)
+        return cls(nodes,offsets,sortedTargets)
+
+    def edgeSources(self):
+        # Source id of every edge, in the order of self.targets
+        if numpy is not None:
+            return numpy.repeat(numpy.arange(self.nodes,dtype=numpy.int32),numpy.diff(numpy.asarray(self.offsets)))
+        sources=array('i')
+        for node in range(self.nodes):
+            sources.extend([node]*(self._offsets[node+1]-self._offsets[node]))
+        return sources
+
+    def reverse(self):
+        # Graph of "who waits on me": edge v->u for every wait edge u->v
+        return CSRGraph.fromEdges(self.targets,self.edgeSources(),self.nodes)
+
 class CycleDetectionDFS:
-    def __init__(self):
-        self.nodes=self.getNumberNodes()
-        self.adjList=self.getAdjList()
-        self.visited=[False]*self.nodes
-        self.recTrack=[False]*self.nodes
+    def __init__(self,adjList=None):
+        # Without an adjacency list the graph is read interactively
+        if adjList is None:
+            self.nodes=self.getNumberNodes()
+            self.adjList=self.getAdjList()
+        else:
+            self.adjList=adjList
+            self.nodes=len(adjList)
+        self.visited=bytearray(self.nodes)
+        self.recTrack=bytearray(self.nodes)
         self.cyclePath=[]
         self.parent={}
         
@@ -25,9 +134,50 @@ class CycleDetectionDFS:
             
             self.adjList.append(temp)
         return self.adjList
-    
-        
+
+    @classmethod
+    def fromEdgeListFile(cls,path,nodes=None):
+        # Text file of whitespace separated "waiter holder" pairs, parsed in
+        # one call instead of per edge
+        with open(path,"rb") as f:
+            data=f.read()
+        if numpy is not None:
+            values=numpy.fromstring(data,dtype=numpy.int64,sep=" ")
+        else:
+            values=array('q',map(int,data.split()))
+        if len(values)%2:
+            raise ValueError(f"{path}: odd number of integers in edge list")
+        return cls(CSRGraph.fromEdges(values[0::2],values[1::2],nodes))
+
+    @classmethod
+    def fromBinaryEdgeFile(cls,path):
+        with open(path,"rb") as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mm:
+            magic,nodes,edges=EDGE_FILE_HEADER.unpack_from(mm)
+            if magic!=EDGE_FILE_MAGIC:
+                raise ValueError(f"{path}: not a wait-for edge file")
+            if len(mm)<EDGE_FILE_HEADER.size+8*edges:
+                raise ValueError(f"{path}: truncated edge file")
+            if numpy is not None:
+                # Zero-copy view of the mapped pairs; the graph build copies out
+                pairs=numpy.frombuffer(mm,dtype="<i4",count=2*edges,offset=EDGE_FILE_HEADER.size)
+                graph=CSRGraph.fromEdges(pairs[0::2],pairs[1::2],nodes)
+                del pairs
+            else:
+                pairs=array('i')
+                pairs.frombytes(mm[EDGE_FILE_HEADER.size:EDGE_FILE_HEADER.size+8*edges])
+                if sys.byteorder=="big":
+                    pairs.byteswap()
+                graph=CSRGraph.fromEdges(pairs[0::2],pairs[1::2],nodes)
+        return cls(graph)
+
+    def resetState(self):
+        self.visited=bytearray(self.nodes)
+        self.recTrack=bytearray(self.nodes)
+        self.cyclePath=[]
+        self.parent={}
+
     def findCycle(self):
+        self.resetState()
         for i in range(self.nodes):
             if not self.visited[i]:
                 if self.dfs(i):
@@ -39,32 +189,217 @@ class CycleDetectionDFS:
         return None
     
     def dfs(self,node):
+        # Explicit stack of (node, successors, next successor index) so long
+        # wait-for chains do not hit the recursion limit
         self.visited[node]=True
         self.recTrack[node]=True
-        
-        for i in self.adjList[node]:
+        stack=[(node,self.adjList[node],0)]
+        while stack:
+            curr,succ,idx=stack[-1]
+            if idx==len(succ):
+                stack.pop()
+                self.recTrack[curr]=False
+                continue
+            stack[-1]=(curr,succ,idx+1)
+            i=succ[idx]
             if not self.visited[i]:
-                self.parent[i]=node
-                if self.dfs(i):
-                    return True
+                self.parent[i]=curr
+                self.visited[i]=True
+                self.recTrack[i]=True
+                stack.append((i,self.adjList[i],0))
             elif self.recTrack[i]:
-                curr=node
                 self.cyclePath.append(i)
                 self.cyclePath.append(curr)
                 while(curr!=i):
                     curr=self.parent[curr]
                     self.cyclePath.append(curr)
-                
-                
                 return True
-        self.recTrack[node]=False
         return False
+
+    def findStronglyConnectedComponents(self):
+        # Iterative Tarjan: every node and edge is handled once, components
+        # come out in reverse topological order of the condensed graph
+        index=array('i',[-1])*self.nodes
+        lowLink=array('i',[0])*self.nodes
+        onStack=bytearray(self.nodes)
+        sccStack=[]
+        components=[]
+        counter=0
+        for root in range(self.nodes):
+            if index[root]!=-1:
+                continue
+            index[root]=lowLink[root]=counter
+            counter+=1
+            sccStack.append(root)
+            onStack[root]=True
+            callStack=[(root,self.adjList[root],0)]
+            while callStack:
+                node,succ,idx=callStack[-1]
+                if idx<len(succ):
+                    callStack[-1]=(node,succ,idx+1)
+                    nxt=succ[idx]
+                    if index[nxt]==-1:
+                        index[nxt]=lowLink[nxt]=counter
+                        counter+=1
+                        sccStack.append(nxt)
+                        onStack[nxt]=True
+                        callStack.append((nxt,self.adjList[nxt],0))
+                    elif onStack[nxt] and index[nxt]<lowLink[node]:
+                        lowLink[node]=index[nxt]
+                    continue
+                callStack.pop()
+                if callStack:
+                    caller=callStack[-1][0]
+                    if lowLink[node]<lowLink[caller]:
+                        lowLink[caller]=lowLink[node]
+                if lowLink[node]==index[node]:
+                    component=[]
+                    while True:
+                        member=sccStack.pop()
+                        onStack[member]=False
+                        component.append(member)
+                        if member==node:
+                            break
+                    components.append(component)
+        return components
+
+    def findDeadlockedSets(self):
+        # A component is deadlocked if it holds a cycle: more than one process
+        # or a process waiting on itself
+        deadlockedSets=[]
+        inDeadlock=bytearray(self.nodes)
+        for component in self.findStronglyConnectedComponents():
+            if len(component)>1 or component[0] in self.adjList[component[0]]:
+                component.sort()
+                deadlockedSets.append(component)
+                for node in component:
+                    inDeadlock[node]=True
+        # Every process that can reach a deadlocked set through wait edges is
+        # blocked behind it, so walk the reversed graph from the deadlocked sets
+        graph=self.adjList
+        if not isinstance(graph,CSRGraph):
+            graph=CSRGraph.fromAdjList(graph)
+        waiters=graph.reverse()
+        reached=inDeadlock[:]
+        frontier=[node for node in range(self.nodes) if inDeadlock[node]]
+        blockedBehind=[]
+        while frontier:
+            node=frontier.pop()
+            for waiter in waiters[node]:
+                if not reached[waiter]:
+                    reached[waiter]=True
+                    blockedBehind.append(waiter)
+                    frontier.append(waiter)
+        blockedBehind.sort()
+        deadlockedSets.sort()
+        return deadlockedSets,blockedBehind
+
+    def findDeadlockNeighbourhood(self,radius=1):
+        # The deadlocked sets and every process within radius wait edges of
+        # them in either direction; large graphs are drawn through this view
+        deadlockedSets,_=self.findDeadlockedSets()
+        focus=[node for component in deadlockedSets for node in component]
+        return expandNeighbourhood(self.adjList,focus,radius),deadlockedSets
+
+    def iterElementaryCycles(self,maxCycles=None,maxLength=None,through=None):
+        # Johnson's algorithm, lazily: yields every elementary cycle as a
+        # closed path [s,...,s] of wait edges. Each search starts at the
+        # smallest node of a nontrivial strongly connected component and stays
+        # inside it; the component is then split again without that node, so
+        # whatever is left without cycles is never walked again. maxLength
+        # caps the number of processes in a cycle, maxCycles the number
+        # yielded; with through only the cycles containing that process are
+        # yielded
+        found=0
+        pending=[component for component in self.findStronglyConnectedComponents()
+                 if len(component)>1 or component[0] in self.adjList[component[0]]]
+        if through is not None:
+            pending=[component for component in pending if through in component]
+        while pending:
+            component=pending.pop()
+            start=through if through is not None else min(component)
+            members=set(component)
+            for cycle in self._circuits(start,members,maxLength):
+                yield cycle
+                found+=1
+                if maxCycles is not None and found>=maxCycles:
+                    return
+            if through is not None:
+                return
+            members.discard(start)
+            pending.extend(self._cyclicComponents(members))
+
+    def _cyclicComponents(self,members):
+        # Strongly connected components with a cycle of the subgraph of members
+        nodes=sorted(members)
+        local={node:i for i,node in enumerate(nodes)}
+        subgraph=[[local[nxt] for nxt in self.adjList[node] if nxt in local] for node in nodes]
+        return [[nodes[i] for i in component]
+                for component in CycleDetectionDFS(subgraph).findStronglyConnectedComponents()
+                if len(component)>1 or component[0] in subgraph[component[0]]]
+
+    def _circuits(self,start,members,maxLength):
+        # One Johnson search from start over the nodes in members.
+        # A node that found no way back to start stays blocked until one of
+        # its successors is unblocked, so dead ends are walked once per start
+        blocked={start}
+        blockedBy={}
+        path=[start]
+        found=[False]
+        stack=[(start,self.adjList[start],0)]
+        while stack:
+            node,succ,idx=stack[-1]
+            if idx<len(succ):
+                stack[-1]=(node,succ,idx+1)
+                nxt=succ[idx]
+                if nxt==start:
+                    yield path+[start]
+                    found[-1]=True
+                elif nxt in members and nxt not in blocked:
+                    if maxLength is not None and len(path)>=maxLength:
+                        # Cut by length, not a dead end: a shorter path may
+                        # still reach start through nxt, so do not block
+                        found[-1]=True
+                    else:
+                        blocked.add(nxt)
+                        path.append(nxt)
+                        found.append(False)
+                        stack.append((nxt,self.adjList[nxt],0))
+                continue
+            stack.pop()
+            path.pop()
+            closed=found.pop()
+            if closed:
+                unblock=[node]
+                while unblock:
+                    curr=unblock.pop()
+                    if curr in blocked:
+                        blocked.discard(curr)
+                        unblock.extend(blockedBy.pop(curr,()))
+                if found:
+                    found[-1]=True
+            else:
+                for nxt in succ:
+                    if nxt in members:
+                        blockedBy.setdefault(nxt,set()).add(node)
+
     def runAlgo(self):
         self.cyclePath=self.findCycle()
         print(self.cyclePath)
         if self.cyclePath:
             self.displayCyclePath()
 
+    def runSCCAlgo(self):
+        deadlockedSets,blockedBehind=self.findDeadlockedSets()
+        if not deadlockedSets:
+            print("No cycle has been found and deadlock is not detected!!")
+            return deadlockedSets,blockedBehind
+        print(f"{len(deadlockedSets)} deadlocked set(s) detected!!")
+        for component in deadlockedSets:
+            print("Deadlocked set:",component)
+        print("Processes blocked behind the deadlocked sets:",blockedBehind)
+        return deadlockedSets,blockedBehind
+
     def displayCyclePath(self):
         print("Cycle Path is:")
         for i in range(len(self.cyclePath)):
@@ -75,9 +410,177 @@ class CycleDetectionDFS:
         print()
     
 
+def writeBinaryEdgeFile(path,sources,targets,nodes):
+    if len(sources)!=len(targets):
+        raise ValueError("sources and targets must have the same length")
+    pairs=array('i',bytes(8*len(sources)))
+    pairs[0::2]=array('i',sources)
+    pairs[1::2]=array('i',targets)
+    if sys.byteorder=="big":
+        pairs.byteswap()
+    with open(path,"wb") as f:
+        f.write(EDGE_FILE_HEADER.pack(EDGE_FILE_MAGIC,nodes,len(sources)))
+        pairs.tofile(f)
+
+def expandNeighbourhood(adjList,focus,radius=1):
+    # The focus nodes and every node within radius edges of them in either
+    # direction, in node order
+    graph=adjList
+    if not isinstance(graph,CSRGraph):
+        graph=CSRGraph.fromAdjList(graph)
+    waiters=graph.reverse()
+    inView=bytearray(graph.nodes)
+    frontier=list(focus)
+    for node in frontier:
+        inView[node]=True
+    for _ in range(radius):
+        reached=[]
+        for node in frontier:
+            for neighbours in (graph[node],waiters[node]):
+                for other in neighbours:
+                    if not inView[other]:
+                        inView[other]=True
+                        reached.append(other)
+        frontier=reached
+    return [node for node in range(graph.nodes) if inView[node]]
+
+def dotAttributes(label=None,colour=None):
+    attributes=[]
+    if label:
+        attributes.append('label="'+label.replace('"','\\"').replace("\n","\\n")+'"')
+    if colour:
+        attributes.append(f"style=filled,fillcolor={colour}")
+    return f" [{','.join(attributes)}]" if attributes else ""
+
+def writeDot(path,nodes,edges):
+    # GraphViz DOT written one line per node and edge, so graphs too big to
+    # lay out in memory can still be rendered. nodes yields (node, label,
+    # colour) and edges (source, target, label); None leaves a field out
+    with open(path,"w") as f:
+        f.write("digraph WaitFor {\n")
+        for node,label,colour in nodes:
+            f.write(f"    {node}{dotAttributes(label,colour)};\n")
+        for source,target,label in edges:
+            f.write(f"    {source} -> {target}{dotAttributes(label)};\n")
+        f.write("}\n")
+
+def writeDotFile(path,adjList,nodes=None,deadlockedSets=()):
+    # nodes limits the file to a subgraph; deadlocked nodes are filled red
+    if nodes is None:
+        nodes=range(len(adjList))
+    inView=bytearray(len(adjList))
+    for node in nodes:
+        inView[node]=True
+    inDeadlock=bytearray(len(adjList))
+    for component in deadlockedSets:
+        for node in component:
+            inDeadlock[node]=True
+    writeDot(path,((node,None,"red" if inDeadlock[node] else None) for node in nodes),
+             ((node,target,None) for node in nodes for target in adjList[node] if inView[target]))
+
+class OnlineCycleDetector:
+    # Wait-for graph kept acyclic under edge insertions and deletions. A
+    # topological order of the processes is maintained (Pearce-Kelly), so an
+    # insert only searches the processes lying between its two endpoints in
+    # that order, and a delete never has to touch the order at all.
+    def __init__(self,nodes=0):
+        self.waitsOn={}
+        self.waitedBy={}
+        self.order={}
+        self.nextPosition=0
+        for node in range(nodes):
+            self._register(node)
+
+    def _register(self,node):
+        if node not in self.order:
+            self.order[node]=self.nextPosition
+            self.nextPosition+=1
+            self.waitsOn[node]=set()
+            self.waitedBy[node]=set()
+
+    def add_wait(self,u,v):
+        # Record that u waits on v. Returns None if the graph stays acyclic,
+        # otherwise the cycle the edge would close as [v,...,u,v]; in that
+        # case the edge is not recorded and u is the natural victim.
+        self._register(u)
+        self._register(v)
+        if v in self.waitsOn[u]:
+            return None
+        if u==v:
+            return [u,u]
+        lower=self.order[v]
+        upper=self.order[u]
+        if lower>upper:
+            self.waitsOn[u].add(v)
+            self.waitedBy[v].add(u)
+            return None
+        # Forward search from v, restricted to positions below u
+        parent={v:None}
+        stack=[v]
+        forward=[]
+        while stack:
+            node=stack.pop()
+            forward.append(node)
+            for nxt in self.waitsOn[node]:
+                if nxt==u:
+                    cyclePath=[]
+                    while node is not None:
+                        cyclePath.append(node)
+                        node=parent[node]
+                    cyclePath.reverse()
+                    cyclePath.append(u)
+                    cyclePath.append(v)
+                    return cyclePath
+                if nxt not in parent and self.order[nxt]<upper:
+                    parent[nxt]=node
+                    stack.append(nxt)
+        # Backward search from u, restricted to positions above v
+        seen={u}
+        stack=[u]
+        backward=[]
+        while stack:
+            node=stack.pop()
+            backward.append(node)
+            for prev in self.waitedBy[node]:
+                if prev not in seen and self.order[prev]>lower:
+                    seen.add(prev)
+                    stack.append(prev)
+        # Everything that reaches u moves in front of everything v reaches,
+        # reusing the positions the affected processes already occupied
+        backward.sort(key=self.order.__getitem__)
+        forward.sort(key=self.order.__getitem__)
+        affected=backward+forward
+        positions=sorted(self.order[node] for node in affected)
+        for node,position in zip(affected,positions):
+            self.order[node]=position
+        self.waitsOn[u].add(v)
+        self.waitedBy[v].add(u)
+        return None
+
+    def remove_wait(self,u,v):
+        # Deleting an edge keeps any topological order valid, so this is O(1)
+        if u in self.waitsOn and v in self.waitsOn[u]:
+            self.waitsOn[u].discard(v)
+            self.waitedBy[v].discard(u)
+            return True
+        return False
+
+    def remove_process(self,node):
+        if node not in self.order:
+            return
+        for v in self.waitsOn.pop(node):
+            self.waitedBy[v].discard(node)
+        for u in self.waitedBy.pop(node):
+            self.waitsOn[u].discard(node)
+        del self.order[node]
+
 class VisualizeGraph:
-    def __init__(self,cyclePath):
+    def __init__(self,cyclePath,outputPath=None):
+        if nx is None:
+            raise ImportError("networkx and matplotlib are required to draw the graph")
         self.cyclePath=cyclePath
+        # With an output path the drawing is saved (.svg, .png, ...) instead of shown
+        self.outputPath=outputPath
         self.graph=nx.DiGraph()
         self.nodes=len(cyclePath)
         self.addEdges()
@@ -89,9 +592,89 @@ class VisualizeGraph:
     def drawGraph(self):
         pos=nx.spring_layout(self.graph)
         nx.draw(self.graph,pos,with_labels=True,arrows=True)
+        showGraph(self.outputPath)
+
+class VisualizeDeadlocks:
+    # Draws only the deadlocked sets and their neighbourhood, so it stays
+    # readable on graphs with thousands of processes
+    def __init__(self,cycleDetection,radius=1,outputPath=None):
+        if nx is None:
+            raise ImportError("networkx and matplotlib are required to draw the graph")
+        self.adjList=cycleDetection.adjList
+        self.nodeList,self.deadlockedSets=cycleDetection.findDeadlockNeighbourhood(radius)
+        self.outputPath=outputPath
+        self.graph=nx.DiGraph()
+        self.addEdges()
+        self.drawGraph()
+    def addEdges(self):
+        self.graph.add_nodes_from(self.nodeList)
+        for node in self.nodeList:
+            for target in self.adjList[node]:
+                if target in self.graph:
+                    self.graph.add_edge(node,target)
+
+    def drawGraph(self):
+        inDeadlock={node for component in self.deadlockedSets for node in component}
+        nodes={node:(str(node),"red" if node in inDeadlock else "orange") for node in self.graph}
+        axes=plt.gca()
+        drawWaitForGraph(axes,nodes,self.graph.edges())
+        axes.axis('off')
+        showGraph(self.outputPath)
+
+def drawWaitForGraph(axes,nodes,edges,pos=None):
+    # Draws nodes {node: (label, colour)} and (source, target) edges on a
+    # matplotlib axis; pos gives starting positions. Returns the graph, the
+    # positions and the node artist so callers can recolour without redrawing
+    graph=nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(edges)
+    # Spring layout of more than a few hundred nodes needs scipy and minutes
+    if len(graph)<=SPRING_LIMIT:
+        pos=nx.spring_layout(graph,pos=pos or None,seed=0)
+    else:
+        pos=nx.circular_layout(graph)
+    labelled=len(graph)<=LABEL_LIMIT
+    nodeList=list(graph.nodes())
+    nodeArtist=nx.draw_networkx_nodes(graph,pos,nodelist=nodeList,node_color=[nodes[node][1] for node in nodeList],
+                                      node_size=1000 if labelled else max(20,40000//len(nodeList)),ax=axes)
+    # Arrow patches are drawn one by one, plain lines in a single collection
+    if labelled:
+        nx.draw_networkx_edges(graph,pos,arrowsize=20,ax=axes)
+        nx.draw_networkx_labels(graph,pos,labels={node:label for node,(label,_) in nodes.items()},
+                                font_size=9,font_weight='bold',ax=axes)
+    else:
+        nx.draw_networkx_edges(graph,pos,arrows=False,width=0.2,ax=axes)
+    return graph,pos,nodeArtist
+
+def showGraph(outputPath=None):
+    if outputPath is None:
         plt.show()
+    else:
+        plt.savefig(outputPath)
+        plt.close()
 
 if __name__=="__main__":
+    # With a file argument the graph is loaded in bulk and every deadlocked
+    # set is reported; otherwise it is entered interactively
+    if len(sys.argv)>1:
+        path=sys.argv[1]
+        with open(path,"rb") as f:
+            isBinary=f.read(len(EDGE_FILE_MAGIC))==EDGE_FILE_MAGIC
+        if isBinary:
+            cycleDetection=CycleDetectionDFS.fromBinaryEdgeFile(path)
+        else:
+            cycleDetection=CycleDetectionDFS.fromEdgeListFile(path)
+        deadlockedSets,_=cycleDetection.runSCCAlgo()
+        # An optional second path exports the deadlocked sets and their
+        # neighbourhood: GraphViz DOT for .dot/.gv, otherwise an image
+        if len(sys.argv)>2:
+            outputPath=sys.argv[2]
+            if outputPath.endswith((".dot",".gv")):
+                nodes,_=cycleDetection.findDeadlockNeighbourhood()
+                writeDotFile(outputPath,cycleDetection.adjList,nodes,deadlockedSets)
+            else:
+                VisualizeDeadlocks(cycleDetection,outputPath=outputPath)
+        sys.exit(0)
     cycleDetection=CycleDetectionDFS()
     cycleDetection.runAlgo()
     if cycleDetection.cyclePath:
@@ -0,0 +1,207 @@
+import os
+import sys
+from array import array
+from itertools import chain
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from CycleDetectionDFS import CSRGraph,CycleDetectionDFS,EDGE_FILE_MAGIC
+try:
+    import numpy
+except ImportError:
+    numpy=None
+
+# Strongly connected components of very large wait-for graphs on several
+# cores. The nodes are split into partitions, typically sites, and a process
+# pool finds the components of the edges inside each partition, reading the
+# CSR arrays from shared memory. Each worker cuts its partition out as a flat
+# local CSR graph and runs the sequential Tarjan on it, so a node costs about
+# what it costs in the sequential pass. A local component that cannot be
+# reached from an edge entering its partition, or cannot reach an edge
+# leaving it, is already a component of the whole graph. Each worker
+# condenses the remaining "open" ones to their wait edges, and those are
+# merged by running Tarjan on the condensed graph. The merge runs on one
+# core, so the speedup is bounded by the share of nodes left open:
+# partitions with few edges between them (sites) leave little, while hashing
+# node ids leaves nearly every node open, which is why there is no such
+# default. The array work around the Tarjan passes needs numpy; without it,
+# or without partitions, the components are found sequentially.
+
+# Arrays mapped by each pool worker, filled in by attachArrays
+shared={}
+
+def shareArray(values):
+    # Copy a flat integer array into a new shared memory block
+    data=memoryview(values).cast('B')
+    block=SharedMemory(create=True,size=max(len(data),1))
+    block.buf[:len(data)]=data
+    return block
+
+def attachArrays(layout):
+    # Pool initializer: map every shared block as a numpy array
+    for name,(blockName,typecode,length) in layout.items():
+        block=SharedMemory(name=blockName)
+        shared[name+"Block"]=block
+        shared[name]=numpy.ndarray((length,),dtype=typecode,buffer=block.buf)
+
+def flatComponents(components):
+    # Components as one array of their nodes and one of their sizes
+    sizes=numpy.fromiter(map(len,components),dtype=numpy.int64,count=len(components))
+    nodes=numpy.fromiter(chain.from_iterable(components),dtype=numpy.int64,count=int(sizes.sum()))
+    return nodes,sizes
+
+def splitComponents(nodes,sizes):
+    # Inverse of flatComponents, as lists of node ids
+    nodes=nodes.tolist()
+    ends=numpy.cumsum(sizes).tolist()
+    return [nodes[start:end] for start,end in zip([0]+ends[:-1],ends)]
+
+def solvePartition(part):
+    # Components of the edges inside one partition. Returns the closed and
+    # the open ones as flat (nodes, sizes) arrays, and the condensed wait
+    # edges of the open ones; writes the root of every open node
+    offsets=shared["offsets"]
+    targets=shared["targets"]
+    partitionOf=shared["partitionOf"]
+    members=shared["members"][shared["memberStart"][part]:shared["memberStart"][part+1]]
+    size=members.size
+    # Every wait of the members, gathered in one step
+    starts=offsets[members]
+    counts=offsets[members+1]-starts
+    positions=numpy.repeat(starts-numpy.cumsum(counts)+counts,counts)+numpy.arange(int(counts.sum()))
+    waits=targets[positions]
+    sources=numpy.repeat(numpy.arange(size),counts)
+    inside=partitionOf[waits]==part
+    # The waits inside the partition as a local CSR graph
+    localOffsets=numpy.zeros(size+1,dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sources[inside],minlength=size),out=localOffsets[1:])
+    localTargets=shared["local"][waits[inside]]
+    components=CycleDetectionDFS(CSRGraph(size,localOffsets,localTargets)).findStronglyConnectedComponents()
+    order,sizes=flatComponents(components)
+    count=sizes.size
+    componentOf=numpy.empty(size,dtype=numpy.int64)
+    componentOf[order]=numpy.repeat(numpy.arange(count),sizes)
+    root=members[order[numpy.cumsum(sizes)-sizes]]
+    # Waits between two different local components. Components come out in
+    # reverse topological order, so every one goes to a lower index:
+    # ascending source order settles which components reach an edge leaving
+    # the partition, descending order which ones an entering edge reaches
+    waitSources=componentOf[sources[inside]]
+    waitTargets=componentOf[localTargets]
+    between=waitSources!=waitTargets
+    waitSources=waitSources[between]
+    waitTargets=waitTargets[between]
+    ascending=numpy.argsort(waitSources,kind='stable')
+    waitSources=waitSources[ascending]
+    waitTargets=waitTargets[ascending]
+    leavingSources=componentOf[sources[~inside]]
+    leaving=numpy.zeros(count,dtype=bool)
+    leaving[leavingSources]=True
+    leaving=leaving.tolist()
+    for source,target in zip(waitSources.tolist(),waitTargets.tolist()):
+        if leaving[target]:
+            leaving[source]=True
+    entered=numpy.zeros(count,dtype=bool)
+    entered[componentOf[numpy.flatnonzero(shared["entries"][members])]]=True
+    entered=entered.tolist()
+    for source,target in zip(waitSources[::-1].tolist(),waitTargets[::-1].tolist()):
+        if entered[source]:
+            entered[target]=True
+    isOpen=numpy.array(leaving)&numpy.array(entered)
+    openNode=isOpen[componentOf]
+    shared["component"][members[openNode]]=root[componentOf[openNode]]
+    # Wait edges of the open components as (root, target) pairs: a target
+    # inside the partition is its open component's root, one in another
+    # partition is left for the merge to map the same way
+    kept=isOpen[waitSources]&isOpen[waitTargets]
+    crossing=isOpen[leavingSources]
+    edgeSources=numpy.concatenate((root[waitSources[kept]],root[leavingSources[crossing]])).astype(numpy.int64)
+    edgeTargets=numpy.concatenate((root[waitTargets[kept]],waits[~inside][crossing]))
+    pairs=numpy.unique(edgeSources*partitionOf.size+edgeTargets)
+    openInOrder=isOpen[componentOf[order]]
+    return (members[order[~openInOrder]],sizes[~isOpen],members[order[openInOrder]],sizes[isOpen],
+            pairs//partitionOf.size,pairs%partitionOf.size)
+
+class ParallelCycleDetection(CycleDetectionDFS):
+    # partitionOf gives a partition (e.g. a site id) per node; without it
+    # the components are found sequentially
+    def __init__(self,adjList,partitionOf=None,workers=None):
+        if not isinstance(adjList,CSRGraph):
+            adjList=CSRGraph.fromAdjList(adjList)
+        super().__init__(adjList)
+        if partitionOf is not None and len(partitionOf)!=self.nodes:
+            raise ValueError(f"{len(partitionOf)} partition ids for {self.nodes} nodes")
+        self.workers=workers or os.cpu_count() or 1
+        self.partitionOf=partitionOf
+
+    def partition(self):
+        # Partition of every node renumbered to 0..P-1, the nodes grouped by
+        # partition, the index of every node within its partition, and which
+        # nodes are waited on from another partition
+        ids,partitionOf=numpy.unique(numpy.asarray(self.partitionOf),return_inverse=True)
+        partitionOf=partitionOf.astype(numpy.int32)
+        members=numpy.argsort(partitionOf,kind='stable').astype(numpy.int32)
+        memberStart=numpy.zeros(ids.size+1,dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(partitionOf,minlength=ids.size),out=memberStart[1:])
+        local=numpy.empty(self.nodes,dtype=numpy.int32)
+        local[members]=numpy.arange(self.nodes)-memberStart[partitionOf[members]]
+        sources=self.adjList.edgeSources()
+        targets=numpy.asarray(self.adjList.targets)
+        entries=numpy.zeros(self.nodes,dtype=numpy.uint8)
+        entries[targets[partitionOf[sources]!=partitionOf[targets]]]=1
+        return ids.size,partitionOf,memberStart,members,local,entries
+
+    def findStronglyConnectedComponents(self):
+        # Components come out grouped by partition, not in topological order
+        if self.workers<=1 or self.nodes==0 or self.partitionOf is None or numpy is None:
+            return super().findStronglyConnectedComponents()
+        parts,partitionOf,memberStart,members,local,entries=self.partition()
+        arrays={"offsets":(self.adjList.offsets,'q'),"targets":(self.adjList.targets,'i'),
+                "partitionOf":(partitionOf,'i'),"memberStart":(memberStart,'q'),
+                "members":(members,'i'),"local":(local,'i'),"entries":(entries,'B'),
+                "component":(numpy.full(self.nodes,-1,dtype=numpy.int64),'q')}
+        blocks={name:shareArray(values) for name,(values,_) in arrays.items()}
+        try:
+            layout={name:(blocks[name].name,typecode,len(values)) for name,(values,typecode) in arrays.items()}
+            components=[]
+            openParts=[]
+            with get_context().Pool(min(self.workers,parts),initializer=attachArrays,initargs=(layout,)) as pool:
+                for closedNodes,closedSizes,*opened in pool.imap_unordered(solvePartition,range(parts)):
+                    components.extend(splitComponents(closedNodes,closedSizes))
+                    openParts.append(opened)
+            component=numpy.frombuffer(blocks["component"].buf,dtype=numpy.int64,count=self.nodes).copy()
+        finally:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+        components.extend(self.mergeOpenComponents(openParts,component))
+        return components
+
+    def mergeOpenComponents(self,openParts,component):
+        # Tarjan on the graph whose nodes are the open local components and
+        # whose edges are the wait edges between two different ones; a
+        # target in a closed component (-1) lies on no cycle through them
+        nodes,sizes,sources,targets=(numpy.concatenate(arrays) for arrays in zip(*openParts))
+        position=numpy.full(self.nodes,-1,dtype=numpy.int64)
+        position[nodes[numpy.cumsum(sizes)-sizes]]=numpy.arange(sizes.size)
+        targets=component[targets]
+        sources=position[sources[targets!=-1]]
+        targets=position[targets[targets!=-1]]
+        openComponents=splitComponents(nodes,sizes)
+        condensed=CycleDetectionDFS(CSRGraph.fromEdges(sources,targets,sizes.size))
+        return [[node for group in merged for node in openComponents[group]]
+                for merged in condensed.findStronglyConnectedComponents()]
+
+if __name__=="__main__":
+    # Usage: ParallelSCCDetection.py graph-file partition-file [workers]
+    # The partition file holds one whitespace separated partition (site) id per node
+    path=sys.argv[1]
+    with open(path,"rb") as f:
+        isBinary=f.read(len(EDGE_FILE_MAGIC))==EDGE_FILE_MAGIC
+    if isBinary:
+        sequential=CycleDetectionDFS.fromBinaryEdgeFile(path)
+    else:
+        sequential=CycleDetectionDFS.fromEdgeListFile(path)
+    with open(sys.argv[2],"rb") as f:
+        partitionOf=array('q',map(int,f.read().split()))
+    workers=int(sys.argv[3]) if len(sys.argv)>3 else None
+    ParallelCycleDetection(sequential.adjList,partitionOf,workers).runSCCAlgo()
@@ -0,0 +1,266 @@
+"""Benchmarks for the centralized (CycleDetectionDFS) and CMH deadlock detectors.
+
+Synthetic wait-for graphs are generated as (pid, sid, blocked, waiting_on)
+records and fed to every selected detector for each size. Every run is timed
+once per round, over several rounds, and its fastest time is kept. One JSON
+object per (generator, size, detector) run is written, so results of two
+releases can be compared with --baseline. --sites and --intra-ratio shape the
+multi_site graphs.
+
+    python benchmarks/benchmark_deadlock.py --sizes 1000 10000 --output bench.jsonl
+    python benchmarks/benchmark_deadlock.py --sizes 1000 10000 --baseline bench.jsonl
+    python benchmarks/benchmark_deadlock.py --generators multi_site --sites 16 --intra-ratio 0.99
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Deadlock-detection-py"))
+sys.path.insert(0, os.path.join(ROOT, "Chandy-haas-misra"))
+
+import CMH_diff_sites as cmh
+import CMH_oracle
+from CMH_simulation import DiscreteEventSimulator
+from CycleDetectionDFS import CSRGraph, CycleDetectionDFS
+
+
+# Graph generators: each returns a list of (pid, sid, blocked, waiting_on)
+
+def random_sparse(n, degree=1.5, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for pid in range(n):
+        waits = {rng.randrange(n) for _ in range(int(degree) + (rng.random() < degree % 1))}
+        records.append((pid, 0, bool(waits), sorted(waits)))
+    return records
+
+
+def chain(n, seed=0):
+    # One long acyclic wait chain ending in a running process
+    return [(pid, 0, pid < n - 1, [pid + 1] if pid < n - 1 else []) for pid in range(n)]
+
+
+def ring(n, seed=0):
+    return [(pid, 0, True, [(pid + 1) % n]) for pid in range(n)]
+
+
+def small_cycles(n, size=3, seed=0):
+    records = []
+    for pid in range(n):
+        start = pid - pid % size
+        end = min(start + size, n)
+        records.append((pid, 0, True, [start + (pid - start + 1) % (end - start)]))
+    return records
+
+
+def multi_site(n, sites=4, intra_ratio=0.9, degree=1.2, seed=0):
+    # Processes are spread over sites; each wait edge stays inside the site
+    # with probability intra_ratio
+    rng = random.Random(seed)
+    members = [list(range(sid, n, sites)) for sid in range(sites)]
+    records = []
+    for pid in range(n):
+        sid = pid % sites
+        waits = set()
+        for _ in range(int(degree) + (rng.random() < degree % 1)):
+            target_site = sid if rng.random() < intra_ratio else rng.randrange(sites)
+            if members[target_site]:
+                waits.add(rng.choice(members[target_site]))
+        records.append((pid, sid, bool(waits), sorted(waits)))
+    return records
+
+
+GENERATORS = {
+    "random_sparse": random_sparse,
+    "chain": chain,
+    "ring": ring,
+    "small_cycles": small_cycles,
+    "multi_site": multi_site,
+}
+
+
+# Detectors: each takes the records and returns a dict of counters
+
+def dfs_scc(records):
+    sources = [pid for pid, _, _, waits in records for _ in waits]
+    targets = [target for _, _, _, waits in records for target in waits]
+    detector = CycleDetectionDFS(CSRGraph.fromEdges(sources, targets, len(records)))
+    deadlockedSets, blockedBehind = detector.findDeadlockedSets()
+    return {"deadlocked": sum(len(component) for component in deadlockedSets),
+            "blocked_behind": len(blockedBehind)}
+
+
+def dfs_cycle(records):
+    detector = CycleDetectionDFS([list(waits) for _, _, _, waits in records])
+    cyclePath = detector.findCycle()
+    return {"cycle_length": len(cyclePath) - 1 if cyclePath else 0}
+
+
+def cmh_headless(records):
+    result = cmh.run_headless(records)
+    return {"deadlocked": len(result["deadlocked"]),
+            "probes_sent": result["probes_sent"],
+            "probes_received": result["probes_received"]}
+
+
+def cmh_site_aware(records):
+    result = cmh.run_headless(records, site_aware=True)
+    return {"deadlocked": len(result["deadlocked"]),
+            "probes_sent": result["probes_sent"],
+            "probes_received": result["probes_received"]}
+
+
+def cmh_oracle(records):
+    deadlocked = CMH_oracle.deadlocked_processes(cmh.build_processes(records))
+    return {"deadlocked": len(deadlocked)}
+
+
+def cmh_simulation(records):
+    result = DiscreteEventSimulator(records).run()
+    return {"deadlocked": len(result["deadlocked"]),
+            "probes_sent": result["probes_sent"],
+            "probes_received": result["probes_received"],
+            "virtual_time": result["end_time"]}
+
+
+DETECTORS = {
+    "dfs_scc": dfs_scc,
+    "dfs_cycle": dfs_cycle,
+    "cmh": cmh_headless,
+    "cmh_site_aware": cmh_site_aware,
+    "cmh_simulation": cmh_simulation,
+}
+# The oracle needs numpy
+if CMH_oracle.numpy is not None:
+    DETECTORS["cmh_oracle"] = cmh_oracle
+
+# The probe engines do far more work per edge than the centralized pass, so
+# by default they are only run up to this many processes
+CMH_DETECTORS = ("cmh", "cmh_site_aware", "cmh_simulation")
+
+
+def measure(detector, records, memory=True):
+    """Wall time of one run, and peak traced memory of a second one"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        result = detector(records)
+        result["wall_time"] = time.perf_counter() - started
+        if memory:
+            tracemalloc.start()
+            detector(records)
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(generators, detectors, sizes, memory=True, seed=0, cmh_max_n=100, repeats=15,
+                   sites=4, intra_ratio=0.9):
+    # Deadlock messages would otherwise be formatted for every detection
+    cmh.event_log.set_level(cmh.WARNING)
+    site_options = {"sites": sites, "intra_ratio": intra_ratio}
+    cases = []
+    for name in generators:
+        options = site_options if name == "multi_site" else {}
+        for n in sizes:
+            records = GENERATORS[name](n, seed=seed, **options)
+            edges = sum(len(waits) for _, _, _, waits in records)
+            for detector in detectors:
+                if detector in CMH_DETECTORS and n > cmh_max_n:
+                    continue
+                cases.append((name, options, n, edges, detector, records))
+    # Every case is timed once per round instead of repeats times in a row,
+    # so a slow spell of the machine costs a case one sample rather than all
+    results = []
+    samples = [[] for _ in cases]
+    for sample in range(repeats):
+        for index, (_, _, _, _, detector, records) in enumerate(cases):
+            result = measure(DETECTORS[detector], records, memory and sample == 0)
+            samples[index].append(result.pop("wall_time"))
+            if sample == 0:
+                results.append(result)
+    for (name, options, n, edges, detector, _), result, times in zip(cases, results, samples):
+        row = {"generator": name, "n": n, "edges": edges, "detector": detector}
+        row.update(options)
+        row.update(result)
+        # The fastest sample is the one least disturbed by the rest of the machine
+        row["wall_time"] = min(times)
+        row["wall_time_median"] = statistics.median(times)
+        row["repeats"] = len(times)
+        if "probes_sent" in result:
+            row["messages_per_edge"] = result["probes_sent"] / edges if edges else 0.0
+        yield row
+
+
+def case_key(row):
+    # multi_site runs are only comparable with the same site layout
+    return row["generator"], row["n"], row["detector"], row.get("sites"), row.get("intra_ratio")
+
+
+def find_regressions(rows, baseline_path, tolerance, min_delta=0.005):
+    """Runs whose fastest wall time grew by more than tolerance and min_delta seconds"""
+    with open(baseline_path) as f:
+        baseline = {}
+        for line in f:
+            row = json.loads(line)
+            baseline[case_key(row)] = row
+    regressions = []
+    for row in rows:
+        old = baseline.get(case_key(row))
+        # On small graphs a few milliseconds are scheduling noise, whatever the ratio
+        if old and row["wall_time"] > max(old["wall_time"] * (1 + tolerance), old["wall_time"] + min_delta):
+            regressions.append((row, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deadlock detectors on synthetic wait-for graphs")
+    parser.add_argument("--generators", nargs="+", choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    parser.add_argument("--detectors", nargs="+", choices=sorted(DETECTORS), default=sorted(DETECTORS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 1000, 10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cmh-max-n", type=int, default=100,
+                        help="largest size the CMH detectors are run on")
+    parser.add_argument("--repeats", type=int, default=15,
+                        help="timed runs per detector and size; the fastest is reported")
+    parser.add_argument("--sites", type=int, default=4, help="sites of the multi_site generator")
+    parser.add_argument("--intra-ratio", type=float, default=0.9,
+                        help="share of multi_site wait edges that stay inside their site")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak-memory run")
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    parser.add_argument("--baseline", help="JSON lines of an earlier run to compare wall times against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative wall-time growth before a run counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.005,
+                        help="seconds a run must slow down by, on top of --tolerance, to count as a regression")
+    args = parser.parse_args()
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    rows = []
+    try:
+        for row in run_benchmarks(args.generators, args.detectors, args.sizes, not args.no_memory,
+                                  args.seed, args.cmh_max_n, args.repeats, args.sites, args.intra_ratio):
+            rows.append(row)
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+    finally:
+        if args.output:
+            out.close()
+
+    if args.baseline:
+        regressions = find_regressions(rows, args.baseline, args.tolerance, args.min_delta)
+        for row, old in regressions:
+            print(f"REGRESSION {row['generator']} n={row['n']} {row['detector']}: "
+                  f"{old['wall_time']:.4f}s -> {row['wall_time']:.4f}s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
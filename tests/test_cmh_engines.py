@@ -0,0 +1,240 @@
+"""Behavioural tests of the Chandy-Misra-Haas engines.
+
+Every engine is run on random wait-for graphs and its deadlocked pids are
+checked against a brute-force reference: a complete all_blocked run flags
+exactly the blocked processes that lie on a cycle of waits between blocked
+processes.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Deadlock-detection-py"))
+sys.path.insert(0, os.path.join(ROOT, "Chandy-haas-misra"))
+
+import CMH_async
+import CMH_diff_sites as cmh
+import CMH_multisite
+import CMH_oracle
+from CMH_simulation import DiscreteEventSimulator
+
+cmh.event_log.set_level(cmh.WARNING)
+
+
+def random_records(rng, max_nodes=12, sites=3, blocked_share=0.8):
+    n = rng.randint(1, max_nodes)
+    records = []
+    for pid in range(n):
+        waits = []
+        for _ in range(rng.randint(0, 3)):
+            wait_pid = rng.randrange(n)
+            if wait_pid not in waits:
+                waits.append(wait_pid)
+        records.append((pid, rng.randrange(sites), rng.random() < blocked_share, waits))
+    return records
+
+
+def brute_deadlocked(records):
+    """Blocked pids that reach themselves through waits between blocked processes"""
+    blocked = {pid for pid, _, is_blocked, _ in records if is_blocked}
+    waits = {pid: [w for w in waiting_on if w in blocked] for pid, _, _, waiting_on in records}
+    deadlocked = []
+    for pid in sorted(blocked):
+        seen = set()
+        stack = list(waits[pid])
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                stack.extend(waits[node])
+        if pid in seen:
+            deadlocked.append(pid)
+    return deadlocked
+
+
+class HeadlessTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(4)
+        for _ in range(200):
+            records = random_records(rng)
+            expected = brute_deadlocked(records)
+            for workers in (0, 1, 3):
+                result = cmh.run_headless(records, workers=workers)
+                self.assertEqual(sorted(result["deadlocked"]), expected)
+                self.assertEqual(result["probes_sent"], result["probes_received"])
+
+    def test_lowest_per_cycle_flags_one_process_per_cycle(self):
+        rng = random.Random(8)
+        for _ in range(200):
+            records = random_records(rng)
+            candidates = cmh.cycle_candidates(cmh.build_processes(records))
+            self.assertEqual(sorted(pid for component in candidates for pid in component),
+                             brute_deadlocked(records))
+            result = cmh.run_headless(records, "lowest_per_cycle")
+            self.assertEqual(sorted(result["deadlocked"]), sorted(component[0] for component in candidates))
+
+    def test_handler_error_is_raised(self):
+        # A float wait makes the receiver's handler fail
+        records = [[0, 0, True, [1]], [1, 0, True, [1.0]]]
+        for workers in (0, 2):
+            with self.assertRaises(TypeError):
+                cmh.run_headless(records, "specified", [0], workers=workers)
+
+
+class ProbePropagationTest(unittest.TestCase):
+    def test_each_initiator_probe_crosses_an_edge_once(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            records = random_records(rng)
+            edges = sum(len(waits) for _, _, _, waits in records)
+            initiators = sum(1 for _, _, blocked, _ in records if blocked)
+            result = cmh.run_headless(records)
+            # declareDeadlock adds a self-wait to every process it flags
+            edges += len(result["deadlocked"])
+            self.assertLessEqual(result["probes_sent"], initiators * edges)
+
+    def test_ring_sends_one_probe_per_initiator_and_edge(self):
+        records = [(pid, pid % 4, True, [(pid + 1) % 100]) for pid in range(100)]
+        result = cmh.run_headless(records)
+        self.assertEqual((len(result["deadlocked"]), result["probes_sent"]), (100, 100 * 100))
+
+
+class SiteAwareTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            records = random_records(rng, max_nodes=15)
+            expected = brute_deadlocked(records)
+            for workers in (0, 2):
+                result = cmh.run_headless(records, site_aware=True, workers=workers)
+                self.assertEqual(sorted(result["deadlocked"]), expected)
+
+    def test_local_chain_sends_nothing(self):
+        records = [(pid, 0, True, [pid + 1]) for pid in range(4999)] + [(4999, 0, True, [])]
+        result = cmh.run_headless(records, site_aware=True)
+        self.assertEqual((result["deadlocked"], result["probes_sent"]), ([], 0))
+        records[-1] = (4999, 0, True, [0])
+        self.assertEqual(len(cmh.run_headless(records, site_aware=True)["deadlocked"]), 5000)
+
+
+class AsyncTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            records = random_records(rng)
+            expected = brute_deadlocked(records)
+            for site_aware in (False, True):
+                result = CMH_async.run_async(records, stop_on_deadlock=False, site_aware=site_aware)
+                self.assertEqual(result["deadlocked"], expected)
+                self.assertTrue(result["quiescent"])
+            first = CMH_async.run_async(records)
+            self.assertEqual(first["deadlock"], bool(expected))
+            self.assertLessEqual(set(first["deadlocked"]), set(expected))
+
+    def test_engine_is_reusable(self):
+        engine = CMH_async.AsyncCMHEngine([(0, 0, True, [1]), (1, 0, True, [0])], stop_on_deadlock=False)
+        for _ in range(2):
+            self.assertEqual(asyncio.run(engine.detect())["deadlocked"], [0, 1])
+
+    def test_handler_error_is_raised(self):
+        records = [[0, 0, True, [1]], [1, 0, True, [1.0]]]
+        with self.assertRaises(TypeError):
+            CMH_async.run_async(records, "specified", [0])
+
+
+class SimulationTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(6)
+        for _ in range(200):
+            records = random_records(rng)
+            expected = brute_deadlocked(records)
+            for site_aware in (False, True):
+                simulator = DiscreteEventSimulator(records, jitter=0.5, seed=rng.randrange(100), site_aware=site_aware)
+                result = simulator.run()
+                self.assertEqual(result["deadlocked"], expected)
+                self.assertEqual(result["in_flight"], 0)
+                # A second run starts again from time zero with the same seed
+                self.assertEqual(simulator.run(), result)
+
+    def test_virtual_time_follows_link_delays(self):
+        # Ring 0 -> 1 -> 2 -> 0 with 1 -> 2 crossing from site 0 to site 1
+        records = [(0, 1, True, [1]), (1, 0, True, [2]), (2, 1, True, [0])]
+        result = DiscreteEventSimulator(records, intra_site_delay=1.0, inter_site_delay=10.0).run()
+        self.assertEqual(result["detection_times"], {0: 21.0, 1: 21.0, 2: 21.0})
+        stopped = DiscreteEventSimulator(records).run(until=20.0)
+        self.assertEqual((stopped["deadlocked"], stopped["end_time"]), ([], 20.0))
+
+
+class MultisiteTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        for _ in range(10):
+            records = random_records(rng, max_nodes=15)
+            expected = brute_deadlocked(records)
+            for site_aware in (False, True):
+                result = CMH_multisite.run_multisite(records, site_aware=site_aware)
+                self.assertEqual(result["deadlocked"], expected)
+
+    def test_no_sites(self):
+        result = CMH_multisite.run_multisite([])
+        self.assertEqual((result["deadlocked"], result["sites"]), ([], []))
+
+    def test_router_batches_and_drops_repeated_probes(self):
+        inboxes = {1: queue.Queue()}
+        router = CMH_multisite.SiteRouter(0, [0, 1, 1], inboxes, multiprocessing.Value('q', 0),
+                                          batch_size=2, batch_window=60)
+        for origin, receiver in ((0, 1), (0, 1), (0, 2), (1, 2)):
+            router.deliver(cmh.Probe(origin, 0, receiver))
+        # The repeated (0, 1) probe is dropped and the first two fill a batch
+        self.assertEqual((router.dropped_probes, router.remote_messages), (1, 1))
+        router.drain()
+        batches = [[(probe.origin, probe.receiver) for probe in inboxes[1].get_nowait()] for _ in range(2)]
+        self.assertEqual(batches, [[(0, 1), (0, 2)], [(1, 2)]])
+        self.assertEqual((router.remote_messages, router.remote_probes, router.outstanding.value), (2, 3, 2))
+
+    def test_batching_keeps_the_result(self):
+        # Every process waits on two others, so repeated probes cross between the sites
+        records = [(pid, pid % 2, True, [(pid + 1) % 40, (pid + 3) % 40]) for pid in range(40)]
+        for batch_size in (1, 256):
+            result = CMH_multisite.run_multisite(records, batch_size=batch_size, batch_window=60)
+            self.assertEqual(result["deadlocked"], list(range(40)))
+            self.assertGreater(result["dropped_probes"], 0)
+            self.assertEqual(result["probes_sent"], result["probes_received"] + result["dropped_probes"])
+            self.assertEqual(result["probes_received"], result["local_messages"] + result["inter_site_probes"])
+            if batch_size == 1:
+                self.assertEqual(result["inter_site_messages"], result["inter_site_probes"])
+            else:
+                self.assertLess(result["inter_site_messages"], result["inter_site_probes"])
+
+
+@unittest.skipIf(CMH_oracle.numpy is None, "numpy is not installed")
+class OracleTest(unittest.TestCase):
+    def test_methods_match_brute_force(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            records = random_records(rng, max_nodes=20)
+            expected = brute_deadlocked(records)
+            for method in CMH_oracle.ORACLE_METHODS:
+                processes = cmh.build_processes(records)
+                self.assertEqual(CMH_oracle.deadlocked_processes(processes, method), expected)
+
+    def test_audit_ignores_self_waits_added_by_the_run(self):
+        records = [(0, 0, True, [1]), (1, 0, True, [2]), (2, 0, True, [])]
+        cmh.run_headless(records)
+        # Whatever the run did to the process list, the audit judges the input
+        cmh.process_list[0].declareDeadlock()
+        report = CMH_oracle.audit({"deadlocked": [0]}, records)
+        self.assertFalse(report["agrees"])
+        self.assertEqual(report["unexpected"], [0])
+        self.assertTrue(CMH_oracle.audit(cmh.run_headless(records), records)["agrees"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+"""Behavioural tests of the cycle and strongly connected component searches.
+
+Every search is checked on random wait-for graphs against a brute-force
+reference built from plain reachability, so the hand-written iterative
+versions (CycleDetectionDFS, ParallelCycleDetection, cycle_candidates,
+OnlineCycleDetector and iterElementaryCycles) are held to the same answer.
+The CSR graph they run on, and the edge files it is loaded from, are
+checked with and without numpy.
+
+    python -m unittest discover tests
+"""
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Deadlock-detection-py"))
+sys.path.insert(0, os.path.join(ROOT, "Chandy-haas-misra"))
+
+import CMH_diff_sites as cmh
+import CycleDetectionDFS as detection
+from CycleDetectionDFS import CSRGraph, CycleDetectionDFS, OnlineCycleDetector
+from ParallelSCCDetection import ParallelCycleDetection
+
+
+def random_graph(rng, max_nodes=12):
+    n = rng.randint(1, max_nodes)
+    adj = [[] for _ in range(n)]
+    for _ in range(rng.randint(0, 3 * n)):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if v not in adj[u]:
+            adj[u].append(v)
+    return adj
+
+
+def reachable(adj, start):
+    """Nodes reachable from start through at least one edge"""
+    seen = set()
+    stack = list(adj[start])
+    while stack:
+        node = stack.pop()
+        if node not in seen:
+            seen.add(node)
+            stack.extend(adj[node])
+    return seen
+
+
+def brute_components(adj):
+    reach = [reachable(adj, node) for node in range(len(adj))]
+    return {frozenset([u] + [v for v in reach[u] if u in reach[v]]) for u in range(len(adj))}
+
+
+def brute_cycles(adj):
+    """Every elementary cycle as a tuple starting at its smallest node"""
+    cycles = set()
+
+    def extend(start, path):
+        for nxt in adj[path[-1]]:
+            if nxt == start:
+                cycles.add(tuple(path))
+            elif nxt > start and nxt not in path:
+                extend(start, path + [nxt])
+
+    for start in range(len(adj)):
+        extend(start, [start])
+    return cycles
+
+
+def canonical(cycle):
+    """Rotation of a closed path [s,...,s] that starts at its smallest node"""
+    nodes = cycle[:-1]
+    first = nodes.index(min(nodes))
+    return tuple(nodes[first:] + nodes[:first])
+
+
+def adjacency(graph):
+    return [list(graph[node]) for node in range(len(graph))]
+
+
+def edge_arrays(adj):
+    sources = [u for u in range(len(adj)) for _ in adj[u]]
+    targets = [v for u in range(len(adj)) for v in adj[u]]
+    return sources, targets
+
+
+class CSRGraphTest(unittest.TestCase):
+    def test_from_edges_matches_adjacency(self):
+        rng = random.Random(6)
+        for _ in range(100):
+            adj = random_graph(rng)
+            sources, targets = edge_arrays(adj)
+            # Shuffled edges keep each node's waits in their original order
+            order = list(range(len(sources)))
+            rng.shuffle(order)
+            sources, targets = [sources[k] for k in order], [targets[k] for k in order]
+            expected = [[targets[k] for k in range(len(sources)) if sources[k] == u] for u in range(len(adj))]
+            for module_numpy in {detection.numpy, None}:
+                with mock.patch.object(detection, "numpy", module_numpy):
+                    graph = CSRGraph.fromEdges(sources, targets, len(adj))
+                    self.assertEqual(adjacency(graph), expected)
+                    self.assertEqual(list(graph.edgeSources()), [u for u in range(len(adj)) for _ in expected[u]])
+                    self.assertEqual(adjacency(graph.reverse()),
+                                     [[u for u in range(len(adj)) for v in expected[u] if v == w]
+                                      for w in range(len(adj))])
+
+    def test_from_edges_node_count(self):
+        for module_numpy in {detection.numpy, None}:
+            with mock.patch.object(detection, "numpy", module_numpy):
+                self.assertEqual(adjacency(CSRGraph.fromEdges([0, 2], [3, 0])), [[3], [], [0], []])
+                self.assertEqual(adjacency(CSRGraph.fromEdges([], [], 2)), [[], []])
+                self.assertEqual(len(CSRGraph.fromEdges([], [])), 0)
+                with self.assertRaises(ValueError):
+                    CSRGraph.fromEdges([0, 1], [1])
+
+
+class EdgeFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.text_path = os.path.join(directory.name, "graph.txt")
+        self.binary_path = os.path.join(directory.name, "graph.wfg")
+
+    def test_round_trip(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            adj = random_graph(rng)
+            # Trailing processes that wait on nothing are only kept by the node count
+            adj += [[] for _ in range(rng.randint(0, 2))]
+            sources, targets = edge_arrays(adj)
+            with open(self.text_path, "w") as f:
+                f.write("".join(f"{u} {v}\n" for u, v in zip(sources, targets)))
+            detection.writeBinaryEdgeFile(self.binary_path, sources, targets, len(adj))
+            for module_numpy in {detection.numpy, None}:
+                with mock.patch.object(detection, "numpy", module_numpy):
+                    loaded = CycleDetectionDFS.fromEdgeListFile(self.text_path, len(adj))
+                    self.assertEqual(adjacency(loaded.adjList), adj)
+                    loaded = CycleDetectionDFS.fromBinaryEdgeFile(self.binary_path)
+                    self.assertEqual((loaded.nodes, adjacency(loaded.adjList)), (len(adj), adj))
+
+    def test_rejects_malformed_files(self):
+        with open(self.text_path, "w") as f:
+            f.write("0 1\n1\n")
+        detection.writeBinaryEdgeFile(self.binary_path, [0, 1], [1, 0], 2)
+        with open(self.binary_path, "rb") as f:
+            data = f.read()
+        for module_numpy in {detection.numpy, None}:
+            with mock.patch.object(detection, "numpy", module_numpy):
+                with self.assertRaises(ValueError):
+                    CycleDetectionDFS.fromEdgeListFile(self.text_path)
+                for broken in (b"XXXX" + data[4:], data[:-1]):
+                    with open(self.binary_path, "wb") as f:
+                        f.write(broken)
+                    with self.assertRaises(ValueError):
+                        CycleDetectionDFS.fromBinaryEdgeFile(self.binary_path)
+
+
+class StronglyConnectedComponentsTest(unittest.TestCase):
+    def test_sequential_matches_reachability(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            adj = random_graph(rng)
+            expected = brute_components(adj)
+            for graph in (adj, CSRGraph.fromAdjList(adj)):
+                components = CycleDetectionDFS(graph).findStronglyConnectedComponents()
+                self.assertEqual(sum(map(len, components)), len(adj))
+                self.assertEqual({frozenset(component) for component in components}, expected)
+
+    def test_deadlocked_sets_and_blocked_behind(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            adj = random_graph(rng)
+            expected = sorted(sorted(component) for component in brute_components(adj)
+                              if len(component) > 1 or next(iter(component)) in adj[next(iter(component))])
+            inDeadlock = {node for component in expected for node in component}
+            behind = sorted(node for node in range(len(adj))
+                            if node not in inDeadlock and reachable(adj, node) & inDeadlock)
+            self.assertEqual(CycleDetectionDFS(adj).findDeadlockedSets(), (expected, behind))
+
+    def test_parallel_matches_reachability(self):
+        rng = random.Random(3)
+        for _ in range(15):
+            adj = random_graph(rng, max_nodes=60)
+            partitionOf = [rng.randrange(4) for _ in adj]
+            detector = ParallelCycleDetection(adj, partitionOf=partitionOf, workers=2)
+            components = detector.findStronglyConnectedComponents()
+            self.assertEqual(sum(map(len, components)), len(adj))
+            self.assertEqual({frozenset(component) for component in components}, brute_components(adj))
+
+    def test_cycle_candidates_only_follow_blocked_processes(self):
+        rng = random.Random(4)
+        for _ in range(200):
+            adj = random_graph(rng)
+            blocked = [rng.random() < 0.8 for _ in adj]
+            processes = cmh.build_processes([(pid, 0, blocked[pid], adj[pid]) for pid in range(len(adj))])
+            waits = [[v for v in adj[u] if blocked[u] and blocked[v]] for u in range(len(adj))]
+            expected = sorted(sorted(component) for component in brute_components(waits)
+                              if len(component) > 1 or next(iter(component)) in waits[next(iter(component))])
+            self.assertEqual(sorted(cmh.cycle_candidates(processes)), expected)
+
+
+class OnlineCycleDetectorTest(unittest.TestCase):
+    def test_inserts_and_deletes_match_reachability(self):
+        rng = random.Random(5)
+        for _ in range(100):
+            n = rng.randint(1, 10)
+            detector = OnlineCycleDetector(n)
+            adj = [set() for _ in range(n)]
+            for _ in range(40):
+                u, v = rng.randrange(n), rng.randrange(n)
+                if rng.random() < 0.25:
+                    self.assertEqual(detector.remove_wait(u, v), v in adj[u])
+                    adj[u].discard(v)
+                    continue
+                cycle = detector.add_wait(u, v)
+                closes = v not in adj[u] and (u == v or u in reachable(adj, v))
+                if not closes:
+                    self.assertIsNone(cycle)
+                    adj[u].add(v)
+                else:
+                    # The edge is refused and the cycle runs v -> ... -> u -> v
+                    self.assertEqual((cycle[0], cycle[-2], cycle[-1]), (v, u, v))
+                    self.assertEqual(len(set(cycle[:-1])), len(cycle) - 1)
+                    for a, b in zip(cycle[:-2], cycle[1:-1]):
+                        self.assertIn(b, adj[a])
+                # Every recorded wait goes forward in the maintained order
+                for a in range(n):
+                    for b in adj[a]:
+                        self.assertLess(detector.order[a], detector.order[b])
+
+
+class ElementaryCyclesTest(unittest.TestCase):
+    def test_all_cycles_match_brute_force(self):
+        rng = random.Random(6)
+        for _ in range(300):
+            adj = random_graph(rng, max_nodes=9)
+            expected = brute_cycles(adj)
+            for graph in (adj, CSRGraph.fromAdjList(adj)):
+                cycles = list(CycleDetectionDFS(graph).iterElementaryCycles())
+                for cycle in cycles:
+                    self.assertEqual(cycle[0], cycle[-1])
+                    for a, b in zip(cycle, cycle[1:]):
+                        self.assertIn(b, adj[a])
+                found = [canonical(cycle) for cycle in cycles]
+                self.assertEqual(len(found), len(set(found)))
+                self.assertEqual(set(found), expected)
+
+    def test_caps_and_through(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            adj = random_graph(rng, max_nodes=9)
+            maxLength = rng.randint(1, 5)
+            bounded = {cycle for cycle in brute_cycles(adj) if len(cycle) <= maxLength}
+            detector = CycleDetectionDFS(adj)
+            found = [canonical(cycle) for cycle in detector.iterElementaryCycles(maxLength=maxLength)]
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(set(found), bounded)
+            node = rng.randrange(len(adj))
+            through = [canonical(cycle) for cycle in detector.iterElementaryCycles(maxLength=maxLength, through=node)]
+            self.assertEqual(len(through), len(set(through)))
+            self.assertEqual(set(through), {cycle for cycle in bounded if node in cycle})
+            maxCycles = rng.randint(1, 4)
+            capped = list(detector.iterElementaryCycles(maxCycles=maxCycles, maxLength=maxLength))
+            self.assertEqual(len(capped), min(maxCycles, len(bounded)))
+
+
+if __name__ == "__main__":
+    unittest.main()